@@ -0,0 +1,22 @@
+"""
+gunicorn.conf.py - production server settings for the Suzy streaming UI (run.py)
+
+    pip install gunicorn gevent
+    gunicorn run:app
+
+Each /api/generate-stream response stays open for the whole generation, and the
+work is almost entirely waiting on the network. gevent workers serve those
+streams from green threads, so one process holds ~worker_connections open streams
+instead of one stream per OS thread as with Flask's dev server.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+worker_class = "gevent"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_connections = 1000  # Concurrent connections (streams) per worker
+
+# Streams may legitimately stay open for a while under a slow model backend
+timeout = 120
+keepalive = 5
@@ -9,25 +9,100 @@ This single-file Flask app demonstrates an elegant streaming UX for content gene
 
 Replace the simulated chunking in `stream_generate_post` with a real streaming AI backend
 (e.g., OpenAI/other model streaming responses, or your streaming microservice).
+
+`python run.py` starts Flask's development server. In production run it under
+gevent workers so open streams don't each hold an OS thread (see gunicorn.conf.py):
+    gunicorn run:app
 """
 import os
+import re
+import gzip
 import time
+import json
+import queue
+import hashlib
+import threading
 from datetime import datetime
-from flask import Flask, request, jsonify, render_template_string, Response, stream_with_context
+from functools import lru_cache
+from flask import Flask, request, Response, stream_with_context
+
+# Optional: C-accelerated JSON encoding (falls back to the stdlib json module)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional: shared Redis cache for strategy responses (set REDIS_URL to enable)
+try:
+    import redis
+except ImportError:
+    redis = None
 
 app = Flask(__name__)
 app.config["JSON_SORT_KEYS"] = False
 
+REDIS_URL = os.getenv("REDIS_URL")
+STRATEGY_CACHE_TTL = 3600  # seconds a strategy stays in Redis
+STREAM_FLUSH_BYTES = 1024  # buffered bytes per streamed chunk
+HOME_MAX_AGE = 3600  # seconds browsers may reuse the homepage without revalidating
+STREAM_QUEUE_SIZE = 8  # chunks a stream producer may run ahead of a slow client
+strategy_cache = redis.Redis.from_url(REDIS_URL) if redis and REDIS_URL else None
+
+
+def _dumps(obj) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _json(obj) -> Response:
+    """JSON response without going through jsonify's str -> bytes round trip."""
+    body = obj if isinstance(obj, bytes) else _dumps(obj)
+    return Response(body, mimetype="application/json")
+
 
 # ---- Placeholder AI / business logic functions ----
+DEFAULT_DRAFT = "Share something interesting about your topic."
+_utc_stamp = (None, "")  # (minute, formatted timestamp) shared by calls in the same minute
+# Shape of an <input type="datetime-local"> value; anything else is rejected without parsing
+_ISO_RE = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}(:\d{2}(\.\d{1,6})?)?$")
+
+
+@lru_cache(maxsize=8)
+def _tone_title(tone: str) -> str:
+    return tone.title()
+
+
+def _utcnow_str() -> str:
+    """Current UTC time as 'YYYY-MM-DD HH:MM UTC', formatted at most once per minute."""
+    global _utc_stamp
+    now = time.time()
+    minute = int(now // 60)
+    if _utc_stamp[0] != minute:
+        _utc_stamp = (minute, time.strftime("%Y-%m-%d %H:%M UTC", time.gmtime(now)))
+    return _utc_stamp[1]
+
+
 def generate_post(draft_text: str, platform: str, tone: str) -> str:
     """Non-streaming generator used for fallback/testing."""
-    now = datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
-    generated = (
-        f"[Suzy draft — {tone.title()} • {platform}] {draft_text.strip() or 'Share something interesting about your topic.'} "
-        f"\n\nSuggested hashtags: #ai #social #suzy\nGenerated at: {now}"
-    )
-    return generated
+    return "".join((
+        "[Suzy draft — ", _tone_title(tone), " • ", platform, "] ",
+        draft_text.strip() or DEFAULT_DRAFT,
+        " \n\nSuggested hashtags: #ai #social #suzy\nGenerated at: ", _utcnow_str(),
+    ))
+
+
+def schedule_note(schedule: str) -> str:
+    """Closing note for a requested schedule time (empty if none was given)."""
+    if not schedule:
+        return ""
+    if _ISO_RE.match(schedule):
+        try:
+            return f"\n\nScheduled for: {datetime.fromisoformat(schedule).isoformat()}"
+        except ValueError:  # right shape, impossible date (e.g. month 13)
+            pass
+    return "\n\nNote: Could not parse scheduled time."
 
 
 def generate_strategy(topic: str, audience: str) -> dict:
@@ -46,32 +121,117 @@ def generate_strategy(topic: str, audience: str) -> dict:
     return suggestions
 
 
+@lru_cache(maxsize=1024)
+def strategy_json(topic: str, audience: str) -> bytes:
+    """
+    Serialized strategy for (topic, audience), cached in-process and, when
+    configured, in Redis so repeat requests skip both building and encoding.
+    """
+    key = b"strat:" + hashlib.blake2b(_dumps([topic, audience]), digest_size=16).digest()
+    if strategy_cache is not None:
+        try:
+            cached = strategy_cache.get(key)
+            if cached is not None:
+                return cached
+        except redis.RedisError as e:
+            app.logger.warning("Strategy cache read failed: %s", e)
+
+    blob = _dumps(generate_strategy(topic, audience))
+    if strategy_cache is not None:
+        try:
+            strategy_cache.setex(key, STRATEGY_CACHE_TTL, blob)
+        except redis.RedisError as e:
+            app.logger.warning("Strategy cache write failed: %s", e)
+    return blob
+
+
 def stream_generate_post(draft_text: str, platform: str, tone: str, schedule: str = None):
     """
-    Simulate a streaming generator that yields chunks of text.
+    Simulate a streaming generator that yields UTF-8 encoded chunks of text.
     Replace this with your model's streaming API (yield tokens/chunks as they arrive).
+    Chunks are yielded as soon as they exist; never sleep here, as that pins a
+    request worker for the whole stream.
+
+    Tokens are buffered and flushed once STREAM_FLUSH_BYTES accumulate, so the
+    response is a few sizeable writes instead of one tiny chunk per word. The
+    first token is flushed immediately to keep time-to-first-byte low.
     """
     base = generate_post(draft_text, platform, tone)
-    # Break into tokens (words) and stream them in small groups to mimic tokens
-    tokens = base.split()
-    chunk_size = 6
-    for i in range(0, len(tokens), chunk_size):
-        chunk = " ".join(tokens[i : i + chunk_size])
-        # prefix to help client parse partial vs final (optional)
-        yield chunk + (" " if not chunk.endswith("\n") else "")
-        # simulate latency from a model streaming tokens
-        time.sleep(0.08)
+    # Break into tokens (words) to mimic a model's token stream; encode once up front
+    tokens = iter(base.encode("utf-8").split())
+    first = next(tokens, None)
+    if first is not None:
+        yield first + b" "
+    buf = bytearray()
+    for token in tokens:
+        buf += token
+        buf += b" "
+        if len(buf) >= STREAM_FLUSH_BYTES:
+            yield bytes(buf)
+            buf.clear()
+    if buf:
+        yield bytes(buf)
 
     # Optionally include scheduling preview as a final note
     if schedule:
-        try:
-            dt = datetime.fromisoformat(schedule)
-            yield f"\n\nScheduled for: {dt.isoformat()}"
-        except Exception:
-            yield "\n\nNote: Could not parse scheduled time."
+        yield schedule_note(schedule).encode("utf-8")
+
+
+_STREAM_END = object()
+
 
-    # final marker (client doesn't strictly need this but it's explicit)
-    yield "\n\n--end--"
+def bounded_stream(chunks, maxsize: int = STREAM_QUEUE_SIZE):
+    """
+    Produce `chunks` on a background thread through a bounded queue.
+    When the client reads slowly the queue fills and the producer blocks,
+    so at most `maxsize` chunks are ever buffered per connection. If the
+    client disconnects, the producer is told to stop instead of blocking forever.
+    Errors raised by the producer are re-raised in the response.
+    """
+    q = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for chunk in chunks:
+                if not put(chunk):
+                    return
+        except Exception as e:
+            put(e)
+            return
+        put(_STREAM_END)
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item = q.get()
+            if item is _STREAM_END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+def sse_events(chunks):
+    """
+    Frame byte chunks as Server-Sent Events: one `data:` line per line of text,
+    a blank line per event, and a closing `event: done` so the client knows the
+    stream ended normally (vs. a dropped connection).
+    """
+    for chunk in chunks:
+        yield b"".join(b"data: " + line + b"\n" for line in chunk.split(b"\n")) + b"\n"
+    yield b"event: done\ndata: \n\n"
 
 
 # ---- Routes & UI ----
@@ -214,6 +374,17 @@ function prefill(text){
   window.scrollTo({top:0,behavior:'smooth'});
 }
 
+// Parse one SSE event block into {type, data}
+function parseSseEvent(block){
+  let type = 'message';
+  const data = [];
+  for (const line of block.split('\\n')) {
+    if (line.startsWith('event:')) type = line.slice(6).trim();
+    else if (line.startsWith('data:')) data.push(line.slice(line.startsWith('data: ') ? 6 : 5));
+  }
+  return {type, data: data.join('\\n')};
+}
+
 let controller = null;
 document.getElementById('generateBtn').addEventListener('click', () => {
   const draft = document.getElementById('draft').value;
@@ -247,22 +418,41 @@ document.getElementById('generateBtn').addEventListener('click', () => {
 
     const reader = resp.body.getReader();
     const decoder = new TextDecoder();
+    const out = document.getElementById('result');
+    let buffer = '';
     let done = false;
+    let finished = false;
+    let scrollPending = false;
 
     try {
-      while (!done) {
+      while (!done && !finished) {
         const { value, done: streamDone } = await reader.read();
         done = streamDone;
         if (value) {
-          const chunk = decoder.decode(value, {stream: true});
-          // append chunk progressively
-          const out = document.getElementById('result');
-          out.textContent += chunk;
-          // maintain scroll to bottom of result for long content
-          out.scrollTop = out.scrollHeight;
+          buffer += decoder.decode(value, {stream: true});
+          // SSE events are separated by a blank line
+          let sep;
+          while ((sep = buffer.indexOf('\\n\\n')) !== -1) {
+            const event = parseSseEvent(buffer.slice(0, sep));
+            buffer = buffer.slice(sep + 2);
+            if (event.type === 'done') {
+              finished = true;
+              break;
+            }
+            // append chunk progressively as its own text node (no re-layout of earlier text)
+            out.appendChild(document.createTextNode(event.data));
+          }
+          // maintain scroll to bottom of result for long content, at most once per frame
+          if (!scrollPending) {
+            scrollPending = true;
+            requestAnimationFrame(() => {
+              scrollPending = false;
+              out.scrollTop = out.scrollHeight;
+            });
+          }
         }
       }
-      document.getElementById('genStatus').textContent = '';
+      document.getElementById('genStatus').textContent = finished ? '' : 'Stream ended unexpectedly';
     } catch (err) {
       if (err.name === 'AbortError') {
         document.getElementById('genStatus').textContent = 'Streaming aborted';
@@ -319,19 +509,41 @@ document.getElementById('strategyBtn').addEventListener('click', async () => {
 </html>
 """
 
+# The homepage is static, so encode, compress and fingerprint it once at import
+# instead of running it through Jinja on every request
+HOME_BYTES = HOME_HTML.encode("utf-8")
+HOME_GZIP = gzip.compress(HOME_BYTES, 6)
+HOME_ETAG = hashlib.sha256(HOME_BYTES).hexdigest()[:32]
+
+
 @app.route("/", methods=["GET"])
 def home():
-    return render_template_string(HOME_HTML)
+    use_gzip = "gzip" in request.headers.get("Accept-Encoding", "")
+    # Each encoding is a distinct representation, so each gets its own strong ETag
+    etag = f'"{HOME_ETAG}-gzip"' if use_gzip else f'"{HOME_ETAG}"'
+    headers = {
+        "ETag": etag,
+        "Vary": "Accept-Encoding",
+        "Cache-Control": f"public, max-age={HOME_MAX_AGE}",
+    }
+    if etag in request.headers.get("If-None-Match", ""):
+        return Response(status=304, headers=headers)
+
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+        return Response(HOME_GZIP, mimetype="text/html", headers=headers)
+    return Response(HOME_BYTES, mimetype="text/html", headers=headers)
 
 
 @app.route("/api/generate-stream", methods=["POST"])
 def api_generate_stream():
     """
-    Streaming endpoint that returns a text/plain streaming response.
+    Streaming endpoint that returns a text/event-stream (SSE) response.
     Body (JSON):
     { "draft": "...", "platform": "Instagram", "tone": "casual", "schedule": "2025-11-05T14:00" }
 
-    The response is a chunked plain text stream. The client progressively reads and renders chunks.
+    Each generated chunk is one `data:` event; the stream ends with `event: done`.
+    The client progressively reads and renders events.
     """
     data = request.get_json() or {}
     draft = data.get("draft", "")
@@ -340,8 +552,15 @@ def api_generate_stream():
     schedule = data.get("schedule")
 
     # Use stream_with_context to ensure request context is available during iteration
-    generator = stream_generate_post(draft, platform, tone, schedule)
-    return Response(stream_with_context(generator), mimetype="text/plain; charset=utf-8")
+    generator = sse_events(bounded_stream(stream_generate_post(draft, platform, tone, schedule)))
+    return Response(
+        stream_with_context(generator),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # stop nginx from buffering the stream
+        },
+    )
 
 
 @app.route("/api/generate", methods=["POST"])
@@ -355,15 +574,9 @@ def api_generate():
     tone = data.get("tone", "casual")
     schedule = data.get("schedule")
 
-    generated_text = generate_post(draft, platform, tone)
-    if schedule:
-        try:
-            parsed = datetime.fromisoformat(schedule)
-            generated_text += f"\n\nScheduled for: {parsed.isoformat()}"
-        except Exception:
-            generated_text += "\n\nNote: Could not parse scheduled time."
+    generated_text = generate_post(draft, platform, tone) + schedule_note(schedule)
 
-    return jsonify({"generated": generated_text})
+    return _json({"generated": generated_text})
 
 
 @app.route("/api/strategy", methods=["POST"])
@@ -371,8 +584,10 @@ def api_strategy():
     data = request.get_json() or {}
     topic = data.get("topic", "general")
     audience = data.get("audience", "everyone")
-    result = generate_strategy(topic, audience)
-    return jsonify(result)
+    if isinstance(topic, str) and isinstance(audience, str):
+        return _json(strategy_json(topic, audience))
+    # Other JSON values (lists, objects) can't be cache keys; build the reply uncached
+    return _json(generate_strategy(topic, audience))
 
 
 if __name__ == "__main__":
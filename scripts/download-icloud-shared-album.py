@@ -3,22 +3,194 @@
 iCloud Shared Album Photo Downloader
 
 This script automates downloading all photos from an iCloud shared album link.
-It uses Selenium to interact with the iCloud web interface.
+It first tries the album's JSON API directly and downloads every photo in
+parallel; if that fails (e.g. the API changes) it falls back to driving the
+iCloud web interface with Selenium, one photo at a time.
 
 Requirements:
     pip install selenium webdriver-manager
+    pip install aiohttp  # optional: fast parallel downloads via the album API
+    pip install watchdog  # optional: detect finished downloads from filesystem events
 """
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from selenium.common.exceptions import (
+    TimeoutException, NoSuchElementException,
+    MoveTargetOutOfBoundsException, StaleElementReferenceException,
+)
 from webdriver_manager.chrome import ChromeDriverManager
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.action_chains import ActionChains
+from selenium.webdriver.common.actions.action_builder import ActionBuilder
+import asyncio
+import json
+import logging
+import re
+import shutil
+import subprocess
+import threading
 import time
 import os
+import sys
+from urllib.parse import urlsplit
+
+# Optional: parallel downloads straight from the album API
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Optional: filesystem events instead of polling the download folder
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+log = logging.getLogger("icloud")
+
+
+class BufferedStreamHandler(logging.StreamHandler):
+    """
+    StreamHandler that writes records in batches instead of flushing after
+    every line. Pending lines go out once `capacity` records are queued, on
+    any warning or error, and otherwise within `interval` seconds via a
+    daemon flusher thread, so a quiet stretch never strands progress lines.
+    close() (called by logging.shutdown at exit) writes whatever is left.
+    """
+    def __init__(self, stream=None, capacity=50, interval=1.0):
+        super().__init__(stream)
+        self.capacity = capacity
+        self.interval = interval
+        self._pending = []
+        self._closed = threading.Event()
+        threading.Thread(target=self._flush_periodically, daemon=True).start()
+    
+    def _flush_periodically(self):
+        while not self._closed.wait(self.interval):
+            self.flush()
+    
+    def emit(self, record):
+        try:
+            msg = self.format(record) + self.terminator
+        except Exception:
+            self.handleError(record)
+            return
+        self.acquire()
+        try:
+            self._pending.append(msg)
+            full = len(self._pending) >= self.capacity
+        finally:
+            self.release()
+        if full or record.levelno >= logging.WARNING:
+            self.flush()
+    
+    def flush(self):
+        self.acquire()
+        try:
+            if self._pending:
+                self.stream.write("".join(self._pending))
+                self._pending.clear()
+            super().flush()
+        finally:
+            self.release()
+    
+    def close(self):
+        self._closed.set()
+        self.flush()
+        super().close()
+
+
+def setup_logging(level=logging.INFO):
+    """Send the downloader's progress messages to stdout through a buffered handler"""
+    handler = BufferedStreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(handler)
+    log.setLevel(level)
+    log.propagate = False
+
+
+class DownloadCompleteHandler(FileSystemEventHandler):
+    """Sets an event when a file finishes downloading (a non-.crdownload file appears)"""
+    def __init__(self, done_event):
+        super().__init__()
+        self.done_event = done_event
+    
+    def on_moved(self, event):
+        # Chrome renames "<name>.crdownload" to "<name>" when the download completes
+        if not event.is_directory and not event.dest_path.endswith('.crdownload'):
+            self.done_event.set()
+    
+    def on_created(self, event):
+        # Small files can be written directly under their final name
+        if not event.is_directory and not event.src_path.endswith('.crdownload'):
+            self.done_event.set()
+
+
+ICLOUD_API_HOST = "p23-sharedstreams.icloud.com"  # Redirects to the album's real partition
+DOWNLOAD_CONCURRENCY = 16  # Parallel photo downloads in the API path
+DOWNLOAD_RETRIES = 3  # Attempts per photo before it is reported as failed
+ALBUM_LOAD_TIMEOUT = 180  # Max seconds to wait for the first photo to render
+PHOTO_SELECTORS = ("img", ".photo-view", ".slideshow-item", "[class*='photo']", "[class*='image']")
+PHOTO_SELECTOR = ", ".join(PHOTO_SELECTORS)
+DOWNLOAD_BUTTON_SELECTORS = ("span.download.title.view.button", "button[aria-label='Download']", ".download-button")
+NEXT_BUTTON_SELECTORS = ("div.x-next-slideshow-item", "button[aria-label='Next']", ".next-button")
+# Hover targets that are missing, off-screen or re-rendered are skipped, not fatal
+HOVER_ERRORS = (NoSuchElementException, MoveTargetOutOfBoundsException, StaleElementReferenceException)
+DRIVER_CACHE_FILE = os.path.join(os.path.expanduser("~"), ".wdm", "icloud-downloader-driver.json")
+DRIVER_CACHE_TTL = 7 * 24 * 3600  # Re-check for a newer chromedriver after a week
+CHROME_BINARIES = (
+    "google-chrome", "google-chrome-stable", "chromium", "chromium-browser", "chrome",
+    "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+)
+
+
+def chrome_major_version():
+    """Major version of the installed Chrome, or None if it can't be determined"""
+    for binary in CHROME_BINARIES:
+        path = shutil.which(binary) or (binary if os.path.isfile(binary) else None)
+        if not path:
+            continue
+        try:
+            output = subprocess.run([path, "--version"], capture_output=True, text=True, timeout=10).stdout
+        except (OSError, subprocess.SubprocessError):
+            continue
+        match = re.search(r"(\d+)\.\d+", output)
+        if match:
+            return match.group(1)
+    return None
+
+
+def get_chromedriver_path():
+    """
+    Path to a chromedriver matching the installed Chrome.
+    ChromeDriverManager().install() checks online for the latest driver on
+    every call, so its result is remembered for DRIVER_CACHE_TTL and reused
+    as long as the binary still exists and Chrome's major version is unchanged.
+    """
+    chrome_major = chrome_major_version()
+    try:
+        if time.time() - os.path.getmtime(DRIVER_CACHE_FILE) < DRIVER_CACHE_TTL:
+            with open(DRIVER_CACHE_FILE) as f:
+                cached = json.load(f)
+            if os.path.isfile(cached["path"]) and cached.get("chrome_major") == chrome_major:
+                return cached["path"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    
+    path = ChromeDriverManager().install()
+    try:
+        os.makedirs(os.path.dirname(DRIVER_CACHE_FILE), exist_ok=True)
+        with open(DRIVER_CACHE_FILE, "w") as f:
+            json.dump({"path": path, "chrome_major": chrome_major}, f)
+    except OSError as e:
+        log.warning(f"Warning: could not cache chromedriver path: {e}")
+    return path
+
 
 class iCloudAlbumDownloader:
     def __init__(self, url, download_dir=None):
@@ -47,16 +219,83 @@ class iCloudAlbumDownloader:
         
         # Initialize driver
         self.driver = None
+        self._vw = self._vh = 0  # Viewport size, read once in start_driver
+        self._photo_sel = None  # Whichever of PHOTO_SELECTORS matched first
+        # Button lookups start with every known variant and are narrowed after the first photo
+        self._download_cond = EC.element_to_be_clickable(
+            (By.CSS_SELECTOR, ", ".join(DOWNLOAD_BUTTON_SELECTORS))
+        )
+        self._download_specialized = False
+        self._next_sel = ", ".join(NEXT_BUTTON_SELECTORS)
+        self._next_specialized = False
+        
+        # Download completion events (only used when watchdog is installed)
+        self.download_done = threading.Event()
+        self.observer = None
     
     def start_driver(self):
         """Initialize the Chrome WebDriver"""
-        print("Starting Chrome WebDriver...")
-        service = Service(ChromeDriverManager().install())
+        log.info("Starting Chrome WebDriver...")
+        service = Service(get_chromedriver_path())
         self.driver = webdriver.Chrome(service=service, options=self.chrome_options)
         self.driver.maximize_window()
+        self._vw, self._vh = self.driver.execute_script("return [innerWidth, innerHeight]")
+        
+        if Observer is not None:
+            self.observer = Observer()
+            self.observer.schedule(DownloadCompleteHandler(self.download_done), self.download_dir)
+            self.observer.start()
+    
+    def stop_observer(self):
+        """Stop the download folder observer if it is running"""
+        if self.observer:
+            self.observer.stop()
+            self.observer.join()
+            self.observer = None
+    
+    def find_photo(self):
+        """
+        Find the photo element to hover over. The first call tries each
+        selector on its own and remembers the one that matched, so later
+        photos are a single cheap lookup instead of the full selector list.
+        
+        Raises:
+            NoSuchElementException: if no photo element is on the page
+        """
+        if self._photo_sel:
+            return self.driver.find_element(By.CSS_SELECTOR, self._photo_sel)
+        for selector in PHOTO_SELECTORS:
+            found = self.driver.find_elements(By.CSS_SELECTOR, selector)
+            if found:
+                self._photo_sel = selector
+                return found[0]
+        raise NoSuchElementException(f"No photo element matches {PHOTO_SELECTOR!r}")
+    
+    def matching_selector(self, element, selectors):
+        """Return the first of `selectors` that `element` matches, or None"""
+        return self.driver.execute_script(
+            "return arguments[1].find(s => arguments[0].matches(s)) || null;",
+            element, list(selectors),
+        )
+    
+    def hover(self, element):
+        """Move the cursor onto an element (fresh action chain, nothing carried over)"""
+        ActionChains(self.driver).move_to_element(element).perform()
+    
+    def hover_center(self):
+        """Move the cursor to the middle of the viewport, in absolute coordinates"""
+        builder = ActionBuilder(self.driver)
+        builder.pointer_action.move_to_location(self._vw // 2, self._vh // 2)
+        builder.perform()
     
     def wait_for_download(self, timeout=30):
         """Wait for download to complete"""
+        if self.observer:
+            # Block on the rename/create event instead of re-listing the folder
+            completed = self.download_done.wait(timeout)
+            self.download_done.clear()
+            return completed
+        
         download_wait_time = 0
         while download_wait_time < timeout:
             # Check if there are any .crdownload files (Chrome's temp download files)
@@ -68,6 +307,97 @@ class iCloudAlbumDownloader:
             download_wait_time += 1
         return False
     
+    async def _api_post(self, session, host, token, endpoint, payload):
+        """POST to the shared-streams API, following its partition redirect (HTTP 330)"""
+        for _ in range(2):
+            url = f"https://{host}/{token}/sharedstreams/{endpoint}"
+            async with session.post(url, json=payload) as resp:
+                if resp.status == 330:
+                    host = (await resp.json(content_type=None))["X-Apple-MMe-Host"]
+                    continue
+                resp.raise_for_status()
+                return host, await resp.json(content_type=None)
+        raise RuntimeError("iCloud API kept redirecting")
+    
+    async def _fetch_photo_urls(self, session, max_photos=None):
+        """Return (photoGuid, download URL) for the largest version of each photo in the album"""
+        token = self.url.split('#', 1)[1].split(';', 1)[0]
+        host, stream = await self._api_post(session, ICLOUD_API_HOST, token, "webstream", {"streamCtag": None})
+        
+        photos = stream["photos"][:max_photos] if max_photos else stream["photos"]
+        checksums = {}
+        for photo in photos:
+            largest = max(photo["derivatives"].values(), key=lambda d: int(d["fileSize"]))
+            checksums[photo["photoGuid"]] = largest["checksum"]
+        
+        _, assets = await self._api_post(
+            session, host, token, "webasseturls", {"photoGuids": list(checksums)}
+        )
+        items = assets["items"]
+        return [
+            (guid, f"https://{items[c]['url_location']}{items[c]['url_path']}")
+            for guid, c in checksums.items() if c in items
+        ]
+    
+    async def _download_all(self, max_photos=None, concurrency=DOWNLOAD_CONCURRENCY):
+        """
+        Download every photo, retrying each a few times. Photos that still fail
+        are logged and skipped; only a failure to list the album is raised.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def fetch(session, guid, url):
+            # Photos from different devices can share a name (IMG_0001.JPG), so tag it with the guid
+            stem, ext = os.path.splitext(os.path.basename(urlsplit(url).path))
+            filename = f"{stem}_{guid[:8]}{ext}"
+            for attempt in range(DOWNLOAD_RETRIES):
+                try:
+                    async with semaphore:
+                        async with session.get(url) as resp:
+                            resp.raise_for_status()
+                            data = await resp.read()
+                    break
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    if attempt == DOWNLOAD_RETRIES - 1:
+                        raise
+                    await asyncio.sleep(2 ** attempt)
+            with open(os.path.join(self.download_dir, filename), 'wb') as f:
+                f.write(data)
+            log.info(f"Downloaded {filename}")
+        
+        async with aiohttp.ClientSession() as session:
+            photos = await self._fetch_photo_urls(session, max_photos)
+            log.info(f"Found {len(photos)} photos, downloading {concurrency} at a time...")
+            results = await asyncio.gather(
+                *(fetch(session, guid, url) for guid, url in photos), return_exceptions=True
+            )
+        
+        failed = [(url, e) for (_, url), e in zip(photos, results) if isinstance(e, BaseException)]
+        for url, e in failed:
+            log.warning(f"Failed to download {url}: {e}")
+        return len(photos) - len(failed)
+    
+    def download_photos_direct(self, max_photos=None):
+        """
+        Download photos straight from the album's CDN URLs, in parallel.
+        No browser involved, so total time is bounded by bandwidth rather than
+        by page loads and clicks per photo.
+        
+        Photos that fail after retries are logged and skipped; an exception
+        means the album itself couldn't be listed (e.g. the API changed).
+        
+        Returns:
+            Number of photos downloaded
+        """
+        if aiohttp is None:
+            raise RuntimeError("aiohttp is not installed")
+        count = asyncio.run(self._download_all(max_photos))
+        log.info(f"\n{'='*50}")
+        log.info(f"Download complete! Total photos downloaded: {count}")
+        log.info(f"Photos saved to: {self.download_dir}")
+        log.info(f"{'='*50}")
+        return count
+    
     def download_photos(self, max_photos=None, delay=2):
         """
         Download photos from the iCloud album
@@ -79,61 +409,58 @@ class iCloudAlbumDownloader:
         try:
             self.start_driver()
             
-            print(f"Opening iCloud album: {self.url}")
+            log.info(f"Opening iCloud album: {self.url}")
             self.driver.get(self.url)
             
             # Wait for page to load
             wait = WebDriverWait(self.driver, 20)
             
-            # Wait for the album to load
-            print("Waiting for album to load (2 minutes)...")
-            time.sleep(120)  # Wait 2 minutes for page to fully load
-            
-            print("Starting download process...")
+            # Wait for the album to load: the document first, then the first photo
+            log.info("Waiting for album to load...")
+            album_wait = WebDriverWait(self.driver, ALBUM_LOAD_TIMEOUT, poll_frequency=0.25)
+            album_wait.until(lambda d: d.execute_script("return document.readyState") == "complete")
+            album_wait.until(lambda d: d.find_elements(By.CSS_SELECTOR, PHOTO_SELECTOR))
             
-            # Create action chains for mouse movements
-            actions = ActionChains(self.driver)
+            log.info("Starting download process...")
             
             photo_count = 0
             
             while True:
                 if max_photos and photo_count >= max_photos:
-                    print(f"\nReached maximum photo limit: {max_photos}")
+                    log.info(f"\nReached maximum photo limit: {max_photos}")
                     break
                 
                 try:
                     # Move mouse to center of the page to make buttons visible
                     # Find the main photo/image area to hover over
                     try:
-                        photo_element = self.driver.find_element(
-                            By.CSS_SELECTOR, 
-                            "img, .photo-view, .slideshow-item, [class*='photo'], [class*='image']"
-                        )
-                        actions.move_to_element(photo_element).perform()
-                        print("Moved cursor to photo area to reveal buttons")
+                        self.hover(self.find_photo())
+                        log.debug("Moved cursor to photo area to reveal buttons")
                         time.sleep(1)
-                    except:
-                        # If can't find photo element, just move to center of screen
-                        viewport_width = self.driver.execute_script("return window.innerWidth")
-                        viewport_height = self.driver.execute_script("return window.innerHeight")
-                        actions.move_by_offset(viewport_width // 2, viewport_height // 2).perform()
-                        print("Moved cursor to center of screen")
+                    except HOVER_ERRORS:
+                        # If can't find or reach photo element, just move to center of screen
+                        self.hover_center()
+                        log.debug("Moved cursor to center of screen")
                         time.sleep(1)
                     
                     # Find and click the download button
-                    download_btn = wait.until(EC.element_to_be_clickable(
-                        (By.CSS_SELECTOR, "span.download.title.view.button, button[aria-label='Download'], .download-button")
-                    ))
+                    download_btn = wait.until(self._download_cond)
+                    if not self._download_specialized:
+                        selector = self.matching_selector(download_btn, DOWNLOAD_BUTTON_SELECTORS)
+                        if selector:
+                            self._download_cond = EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
+                        self._download_specialized = True
                     
-                    print(f"\nDownloading photo {photo_count + 1}...")
+                    log.info(f"\nDownloading photo {photo_count + 1}...")
+                    self.download_done.clear()
                     download_btn.click()
                     
                     # Wait for download to complete
                     if self.wait_for_download():
                         photo_count += 1
-                        print(f"Photo {photo_count} downloaded successfully")
+                        log.info(f"Photo {photo_count} downloaded successfully")
                     else:
-                        print(f"Warning: Download may not have completed for photo {photo_count + 1}")
+                        log.warning(f"Warning: Download may not have completed for photo {photo_count + 1}")
                         photo_count += 1
                     
                     time.sleep(delay)
@@ -142,22 +469,18 @@ class iCloudAlbumDownloader:
                     try:
                         # First, move cursor again to ensure next button is visible
                         try:
-                            photo_element = self.driver.find_element(
-                                By.CSS_SELECTOR, 
-                                "img, .photo-view, .slideshow-item, [class*='photo'], [class*='image']"
-                            )
-                            actions.move_to_element(photo_element).perform()
+                            self.hover(self.find_photo())
                             time.sleep(0.5)
-                        except:
+                        except HOVER_ERRORS:
                             pass
                         
-                        next_btn = self.driver.find_element(
-                            By.CSS_SELECTOR, 
-                            "div.x-next-slideshow-item, button[aria-label='Next'], .next-button"
-                        )
+                        next_btn = self.driver.find_element(By.CSS_SELECTOR, self._next_sel)
+                        if not self._next_specialized:
+                            self._next_sel = self.matching_selector(next_btn, NEXT_BUTTON_SELECTORS) or self._next_sel
+                            self._next_specialized = True
                         
                         # Move cursor to the next button to make it visible/active
-                        actions.move_to_element(next_btn).perform()
+                        self.hover(next_btn)
                         time.sleep(0.5)
                         
                         # Check if next button is visible/enabled
@@ -166,44 +489,48 @@ class iCloudAlbumDownloader:
                         
                         if is_displayed and 'display: none' not in (style or ''):
                             next_btn.click()
-                            print("Moving to next photo...")
+                            log.info("Moving to next photo...")
                             time.sleep(1)
                         else:
                             # Try clicking anyway as it might be hidden but functional
                             try:
                                 next_btn.click()
-                                print("Moving to next photo...")
+                                log.info("Moving to next photo...")
                                 time.sleep(1)
                             except:
-                                print("\nNo more photos available (Next button not clickable)")
+                                log.info("\nNo more photos available (Next button not clickable)")
                                 break
                             
                     except NoSuchElementException:
-                        print("\nReached the end of the album (No next button found)")
+                        log.info("\nReached the end of the album (No next button found)")
                         break
                 
                 except TimeoutException:
-                    print("\nCould not find download button. Possible end of album or page issue.")
+                    log.info("\nCould not find download button. Possible end of album or page issue.")
                     break
                 except Exception as e:
-                    print(f"\nError during download: {str(e)}")
+                    log.error(f"\nError during download: {str(e)}")
                     break
             
-            print(f"\n{'='*50}")
-            print(f"Download complete! Total photos downloaded: {photo_count}")
-            print(f"Photos saved to: {self.download_dir}")
-            print(f"{'='*50}")
+            log.info(f"\n{'='*50}")
+            log.info(f"Download complete! Total photos downloaded: {photo_count}")
+            log.info(f"Photos saved to: {self.download_dir}")
+            log.info(f"{'='*50}")
             
         except Exception as e:
-            print(f"\nAn error occurred: {str(e)}")
+            log.error(f"\nAn error occurred: {str(e)}")
         
         finally:
+            self.stop_observer()
             if self.driver:
-                print("\nClosing browser...")
+                log.info("\nClosing browser...")
                 time.sleep(2)
                 self.driver.quit()
 
 def main():
+    # Use logging.DEBUG to also see cursor movements, logging.WARNING for errors only
+    setup_logging(logging.INFO)
+    
     # Example usage
     icloud_url = "https://www.icloud.com/sharedalbum/#B245oqs3q2TmTut;89E5B594-AF83-4EE2-863C-A3E194B874F7"
     
@@ -214,8 +541,13 @@ def main():
     downloader = iCloudAlbumDownloader(icloud_url, download_directory)
     
     # Download all photos (or specify max_photos=10 to limit)
-    # delay parameter controls seconds between downloads (adjust if needed)
-    downloader.download_photos(max_photos=None, delay=2)
+    try:
+        downloader.download_photos_direct(max_photos=None)
+    except Exception as e:
+        # Only reached if the album couldn't be listed; single photo failures are just logged
+        log.warning(f"Direct download failed ({e}), falling back to the browser...")
+        # delay parameter controls seconds between downloads (adjust if needed)
+        downloader.download_photos(max_photos=None, delay=2)
 
 
 if __name__ == "__main__":
@@ -3,13 +3,135 @@ image_cache.py
 
 Intelligent caching system for image analysis results.
 Saves analysis results to avoid re-analyzing the same images.
+
+Requirements:
+    pip install orjson  # optional: faster import of old JSON caches (falls back to json)
+    pip install zstandard  # optional: compress stored explanations (falls back to plain text)
+    pip install ijson  # optional: stream large old JSON caches during import (falls back to loading whole)
 """
 
+import os
 import json
+import time
+import sqlite3
 import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional, Union
+
+# Optional: C JSON decoder for importing pre-SQLite caches
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Optional: incremental JSON parser, so importing a huge old cache doesn't build it all in memory
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Optional: zstd compression for explanation text
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DIGEST_SIZE = 8  # 64-bit keys; collisions are negligible for one user's images
+# Fixed, not picked by which packages import: every environment sharing a database must agree
+HASH_ALGORITHM = f"blake2b-{DIGEST_SIZE * 8}"
+IMAGE_HASH_MEMO_SIZE = 4096  # (path, mtime, size) -> digest entries kept in memory (bulk_prime may raise it)
+IO_BUFFER_SIZE = 1 << 20  # Legacy JSON caches are read through 1 MB buffers
+HASH_PREFIX_BYTES = 1 << 20  # Images are identified by a hash of their first 1 MB
+PRIME_WORKERS = min(32, (os.cpu_count() or 1) * 4)  # Threads for bulk_prime (mostly waiting on disk)
+ZSTD_LEVEL = 3
+BUSY_TIMEOUT = 30  # Seconds a write waits for another connection's write to finish
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries(
+    img_hash BLOB NOT NULL,  -- raw digest (hex TEXT for keys awaiting migration)
+    query_hash BLOB NOT NULL,
+    is_match INTEGER NOT NULL,
+    explanation NOT NULL,  -- TEXT, or a zstd-compressed BLOB
+    ts INTEGER NOT NULL,
+    PRIMARY KEY (img_hash, query_hash)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_query ON entries(query_hash);
+CREATE INDEX IF NOT EXISTS entries_ts ON entries(ts);
+CREATE TABLE IF NOT EXISTS legacy_keys(
+    img_hash TEXT NOT NULL,
+    query_hash TEXT NOT NULL,
+    PRIMARY KEY (img_hash, query_hash)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta(k TEXT PRIMARY KEY, v TEXT);
+"""
+
+
+Digest = Union[bytes, str]
+
+
+def _digest(data: bytes, algorithm: str = HASH_ALGORITHM) -> Digest:
+    """
+    Digest of data with the given algorithm: raw bytes for "blake2b-<bits>",
+    hex for "md5", which the old JSON cache was keyed with.
+    """
+    if algorithm == "md5":
+        return hashlib.md5(data).hexdigest()
+    bits = int(algorithm.partition("-")[2])
+    return hashlib.blake2b(data, digest_size=bits // 8).digest()
+
+
+def _hash_image_file(image_path, algorithms: Tuple[str, ...] = (HASH_ALGORITHM,)
+                     ) -> Tuple[Tuple[str, int, int], Dict[str, Digest]]:
+    """
+    Return ((path, mtime_ns, size), {algorithm: digest of the first 1MB});
+    raises OSError if unreadable. The file is read once for all algorithms.
+    Reads through a raw fd with pread (no buffered file object or extra copy)
+    and tells the kernel the read is sequential so it reads ahead.
+    """
+    fd = os.open(image_path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        st = os.fstat(fd)
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, HASH_PREFIX_BYTES, os.POSIX_FADV_SEQUENTIAL)
+        if hasattr(os, "pread"):
+            content = os.pread(fd, HASH_PREFIX_BYTES, 0)
+        else:
+            content = os.read(fd, HASH_PREFIX_BYTES)
+    finally:
+        os.close(fd)
+    return (str(image_path), st.st_mtime_ns, st.st_size), {a: _digest(content, a) for a in algorithms}
+
+
+_zstd_compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL) if zstandard else None
+_zstd_decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+
+def _pack_explanation(explanation: str):
+    """Compress explanation text for storage; kept as TEXT if zstd is missing or doesn't help"""
+    data = explanation.encode()
+    if _zstd_compressor is not None:
+        packed = _zstd_compressor.compress(data)
+        if len(packed) < len(data):
+            return packed
+    return explanation
+
+
+def _unpack_explanation(stored) -> Optional[str]:
+    """Inverse of _pack_explanation; None if the row is compressed and zstd isn't installed"""
+    if isinstance(stored, bytes):
+        return _zstd_decompressor.decompress(stored).decode() if _zstd_decompressor else None
+    return stored
+
+
+@lru_cache(maxsize=1024)
+def _query_digest(expanded_query: str, algorithm: str = HASH_ALGORITHM) -> Digest:
+    """Digest of an expanded query; one query is checked against many images"""
+    return _digest(expanded_query.encode(), algorithm)
+
 
 class ImageAnalysisCache:
     """
@@ -17,76 +139,237 @@ class ImageAnalysisCache:
     - Image hash (content-based, not filename)
     - Query hash (expanded query description)
     
+    Entries live in a SQLite database (WAL mode), one row per
+    (image hash, query hash), so inserts and deletes touch only their own rows
+    and several processes can share one cache. Every write is its own short
+    transaction, so no lock is held between calls.
+    
     This allows:
     1. Same image with different filenames = cached
     2. Same query phrasing = cached (via query expansion cache)
     3. Different queries on same images = separate cache entries
     """
     
-    def __init__(self, cache_file: str = "image_analysis_cache.json"):
+    def __init__(self, cache_file: str = "image_analysis_cache.db", fsync_on_save: bool = False):
+        """
+        Args:
+            cache_file: Database file name, relative to this module's folder
+            fsync_on_save: Use synchronous=FULL so every write is on disk before
+                it returns. The default (NORMAL) is still crash-safe in WAL
+                mode, but the last writes can be lost on power failure.
+        """
         self.cache_file = Path(__file__).parent / cache_file
-        self.cache = self._load_cache()
+        self.fsync_on_save = fsync_on_save
+        # LRU of image digests, so an image checked against many queries is read once
+        self._img_hash_cache: "OrderedDict[Tuple[str, int, int], Dict[str, Digest]]" = OrderedDict()
+        self._img_hash_memo_size = IMAGE_HASH_MEMO_SIZE
+        # Distinct query hashes, read from the table on first use and kept up to date after
+        self._known_queries: Optional[set] = None
         self.stats = {
             "hits": 0,
             "misses": 0,
             "total_queries": 0
         }
+        
+        self._conn = sqlite3.connect(self.cache_file, timeout=BUSY_TIMEOUT, isolation_level=None,
+                                     check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(f"PRAGMA synchronous={'FULL' if fsync_on_save else 'NORMAL'}")
+        self._conn.executescript(SCHEMA)
+        self._legacy_algorithm = self._init_hash_algorithm()
     
-    def _load_cache(self) -> Dict:
-        """Load cache from JSON file"""
-        if self.cache_file.exists():
-            try:
-                with open(self.cache_file, 'r') as f:
-                    data = json.load(f)
-                    # Migrate old format if needed
-                    if isinstance(data, dict) and "cache" in data:
-                        return data["cache"]
-                    return data
-            except Exception as e:
-                print(f"Warning: Failed to load cache: {e}")
-                return {}
-        return {}
-    
-    def _save_cache(self):
-        """Save cache to JSON file"""
+    def _meta(self, key: str) -> Optional[str]:
+        row = self._conn.execute("SELECT v FROM meta WHERE k = ?", (key,)).fetchone()
+        return row[0] if row else None
+    
+    def _set_meta(self, key: str, value: Optional[str]):
+        if value is None:
+            self._conn.execute("DELETE FROM meta WHERE k = ?", (key,))
+        else:
+            self._conn.execute("INSERT OR REPLACE INTO meta(k, v) VALUES(?, ?)", (key, value))
+    
+    def _init_hash_algorithm(self) -> Optional[str]:
+        """
+        Make sure stored keys can be matched with our hash algorithm.
+        A new database imports any pre-SQLite JSON cache. If the stored keys
+        were made with another algorithm, they are listed in legacy_keys and
+        re-keyed as they are hit (see _migrate_legacy_key).
+        
+        Returns:
+            The algorithm of keys still awaiting migration, if it is available here
+        """
+        with self._conn:
+            # Taken before reading, so two instances opening a new database don't both import
+            self._conn.execute("BEGIN IMMEDIATE")
+            stored = self._meta("hash_algorithm")
+            if stored is None:
+                self._import_legacy_json()
+            elif stored != HASH_ALGORITHM:
+                self._conn.execute("DELETE FROM legacy_keys")
+                self._conn.execute("INSERT INTO legacy_keys SELECT img_hash, query_hash FROM entries")
+                self._set_meta("legacy_hash_algorithm", stored)
+            self._set_meta("hash_algorithm", HASH_ALGORITHM)
+            if self._conn.execute("SELECT 1 FROM legacy_keys LIMIT 1").fetchone() is None:
+                self._set_meta("legacy_hash_algorithm", None)  # Every old key has been re-keyed
+        
+        legacy = self._meta("legacy_hash_algorithm")
+        # Keys from algorithms we can't recompute (e.g. blake3 in early builds) just age out
+        if legacy == "md5" or (legacy or "").startswith("blake2b-"):
+            return legacy
+        return None
+    
+    # -------------------------
+    # Pre-SQLite JSON caches
+    # -------------------------
+    def _import_legacy_json(self):
+        """
+        Copy entries from image_analysis_cache.json, the cache file earlier
+        versions wrote next to the database ({"cache": {"img_md5:query_md5": entry}}).
+        The old file is left in place; its MD5 keys are re-keyed on hit.
+        """
+        json_file = self.cache_file.with_suffix(".json")
+        if not json_file.exists():
+            return
         try:
-            # Add metadata
-            data = {
-                "cache": self.cache,
-                "metadata": {
-                    "last_updated": datetime.now().isoformat(),
-                    "total_entries": len(self.cache),
-                    "stats": self.stats
-                }
-            }
-            with open(self.cache_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            with open(json_file, 'rb', buffering=IO_BUFFER_SIZE) as f:
+                if ijson:
+                    # Entries are parsed and inserted one at a time, so memory stays flat
+                    items = ijson.kvitems(f, "cache")
+                else:
+                    data = orjson.loads(f.read()) if orjson else json.load(f)
+                    items = data["cache"].items()
+                self._conn.executemany("INSERT OR REPLACE INTO entries VALUES(?, ?, ?, ?, ?)",
+                                       self._json_rows(items))
         except Exception as e:
-            print(f"Warning: Failed to save cache: {e}")
+            self._conn.execute("DELETE FROM entries")  # Don't keep a partial import
+            print(f"Warning: Failed to import old JSON cache: {e}")
+            return
+        
+        if self._count_entries():
+            self._conn.execute("INSERT OR IGNORE INTO legacy_keys SELECT img_hash, query_hash FROM entries")
+            self._set_meta("legacy_hash_algorithm", "md5")
+    
+    @staticmethod
+    def _json_rows(items):
+        """(img_hash, query_hash, is_match, explanation, timestamp) rows from {"img:query": entry} items"""
+        for key, entry in items:
+            img_hash, query_hash = key.split(":", 1)
+            timestamp = int(datetime.fromisoformat(entry["timestamp"]).timestamp())
+            yield (img_hash, query_hash, entry["is_match"], entry["explanation"], timestamp)
     
-    def _get_image_hash(self, image_path: Path) -> str:
+    # -------------------------
+    # Keys
+    # -------------------------
+    def _get_image_hash(self, image_path: Path, algorithm: str = HASH_ALGORITHM) -> Digest:
         """
         Generate content-based hash of image file.
         Uses first 1MB of file for speed (good enough for uniqueness).
+        Digests are memoized per (path, mtime, size), so an unchanged file is
+        only read and hashed once per session. While old keys await migration
+        the legacy digest is computed from the same read.
         """
         try:
-            with open(image_path, 'rb') as f:
-                # Read first 1MB or entire file if smaller
-                content = f.read(1024 * 1024)
-                return hashlib.md5(content).hexdigest()
+            st = os.stat(image_path)
+            memo_key = (str(image_path), st.st_mtime_ns, st.st_size)
+            cached = self._img_hash_cache.get(memo_key)
+            if cached is not None and algorithm in cached:
+                self._img_hash_cache.move_to_end(memo_key)
+                return cached[algorithm]
+            algorithms = tuple(dict.fromkeys((*self._hash_algorithms(), algorithm)))
+            memo_key, digests = _hash_image_file(image_path, algorithms)
         except Exception as e:
             # Fallback to path-based hash if file can't be read
-            return hashlib.md5(str(image_path).encode()).hexdigest()
+            return _digest(str(image_path).encode(), algorithm)
+        
+        self._remember_image_hash(memo_key, digests)
+        return digests[algorithm]
+    
+    def _hash_algorithms(self) -> Tuple[str, ...]:
+        """Algorithms lookups need: the current one, plus the legacy one while keys await migration"""
+        return (HASH_ALGORITHM, self._legacy_algorithm) if self._legacy_algorithm else (HASH_ALGORITHM,)
+    
+    def _remember_image_hash(self, memo_key: Tuple[str, int, int], digests: Dict[str, Digest]):
+        self._img_hash_cache[memo_key] = digests
+        self._img_hash_cache.move_to_end(memo_key)
+        if len(self._img_hash_cache) > self._img_hash_memo_size:
+            self._img_hash_cache.popitem(last=False)
+    
+    def bulk_prime(self, image_paths: List[Path]):
+        """
+        Hash many images up front on a thread pool, so the get()/set() calls
+        that follow find their digests memoized. File reads and hashing both
+        release the GIL, so a cold folder is read in parallel instead of one
+        1MB read at a time. Unreadable files are skipped (get() falls back to
+        a path hash for them as usual).
+        """
+        algorithms = self._hash_algorithms()
+        # Room for every primed digest, or the first ones are evicted before get() reaches them
+        self._img_hash_memo_size = max(self._img_hash_memo_size, len(image_paths))
+        
+        def hash_one(image_path):
+            try:
+                return _hash_image_file(image_path, algorithms)
+            except OSError:
+                return None
+        
+        with ThreadPoolExecutor(max_workers=PRIME_WORKERS) as executor:
+            for result in executor.map(hash_one, image_paths):
+                if result is not None:
+                    self._remember_image_hash(*result)
     
-    def _get_query_hash(self, expanded_query: str) -> str:
+    def _get_query_hash(self, expanded_query: str, algorithm: str = HASH_ALGORITHM) -> Digest:
         """Generate hash of expanded query"""
-        return hashlib.md5(expanded_query.encode()).hexdigest()
+        return _query_digest(expanded_query, algorithm)
     
-    def _get_cache_key(self, image_path: Path, expanded_query: str) -> str:
-        """Generate unique cache key for image + query combination"""
-        img_hash = self._get_image_hash(image_path)
-        query_hash = self._get_query_hash(expanded_query)
-        return f"{img_hash}:{query_hash}"
+    def _get_cache_key(self, image_path: Path, expanded_query: str,
+                       algorithm: str = HASH_ALGORITHM) -> Tuple[Digest, Digest]:
+        """Generate the (image hash, query hash) key for image + query combination"""
+        img_hash = self._get_image_hash(image_path, algorithm)
+        query_hash = self._get_query_hash(expanded_query, algorithm)
+        return img_hash, query_hash
+    
+    # -------------------------
+    # Entries
+    # -------------------------
+    def _count_entries(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+    
+    @staticmethod
+    def _hex(digest: Digest) -> str:
+        return digest.hex() if isinstance(digest, bytes) else digest
+    
+    def snapshot(self) -> Dict[str, Dict[str, tuple]]:
+        """All entries as one {image_hash: {query_hash: (is_match, explanation, timestamp)}} dict, hex keys"""
+        nested = {}
+        for img_hash, query_hash, is_match, explanation, ts in self._conn.execute("SELECT * FROM entries"):
+            entry = (bool(is_match), _unpack_explanation(explanation), ts)
+            nested.setdefault(self._hex(img_hash), {})[self._hex(query_hash)] = entry
+        return nested
+    
+    def _migrate_legacy_key(self, image_path: Path, expanded_query: str) -> Optional[tuple]:
+        """Move an entry stored under the old hash algorithm's key to the current key"""
+        if not self._legacy_algorithm:
+            return None
+        legacy_key = self._get_cache_key(image_path, expanded_query, self._legacy_algorithm)
+        # Plain read first: a miss (the usual case) mustn't take the write lock
+        if self._conn.execute("SELECT 1 FROM legacy_keys WHERE img_hash = ? AND query_hash = ?",
+                              legacy_key).fetchone() is None:
+            return None
+        img_hash, query_hash = self._get_cache_key(image_path, expanded_query)
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            # Another instance may have re-keyed it since the check; then the row is already moved
+            if self._conn.execute("DELETE FROM legacy_keys WHERE img_hash = ? AND query_hash = ?",
+                                  legacy_key).rowcount:
+                self._conn.execute(
+                    "UPDATE OR REPLACE entries SET img_hash = ?, query_hash = ? WHERE img_hash = ? AND query_hash = ?",
+                    (img_hash, query_hash, *legacy_key),
+                )
+        self._known_queries = None  # The old query hash may have lost its last entry
+        return self._conn.execute(
+            "SELECT is_match, explanation FROM entries WHERE img_hash = ? AND query_hash = ?",
+            (img_hash, query_hash),
+        ).fetchone()
     
     def get(self, image_path: Path, expanded_query: str) -> Optional[Tuple[bool, str]]:
         """
@@ -95,12 +378,19 @@ class ImageAnalysisCache:
         Returns:
             (is_match, explanation) if cached, None if not found
         """
-        cache_key = self._get_cache_key(image_path, expanded_query)
+        img_hash, query_hash = self._get_cache_key(image_path, expanded_query)
         
-        if cache_key in self.cache:
+        row = self._conn.execute(
+            "SELECT is_match, explanation FROM entries WHERE img_hash = ? AND query_hash = ?",
+            (img_hash, query_hash),
+        ).fetchone()
+        if row is None:
+            row = self._migrate_legacy_key(image_path, expanded_query)
+        # Compressed rows read without zstandard installed count as misses
+        explanation = _unpack_explanation(row[1]) if row is not None else None
+        if explanation is not None:
             self.stats["hits"] += 1
-            entry = self.cache[cache_key]
-            return (entry["is_match"], entry["explanation"])
+            return (bool(row[0]), explanation)
         
         self.stats["misses"] += 1
         return None
@@ -109,18 +399,25 @@ class ImageAnalysisCache:
         """
         Store analysis result in cache.
         """
-        cache_key = self._get_cache_key(image_path, expanded_query)
+        img_hash, query_hash = self._get_cache_key(image_path, expanded_query)
         
-        self.cache[cache_key] = {
-            "is_match": is_match,
-            "explanation": explanation,
-            "image_path": str(image_path),  # For reference only
-            "timestamp": datetime.now().isoformat()
-        }
+        # Timestamp is Unix epoch seconds
+        self._conn.execute(
+            "INSERT OR REPLACE INTO entries VALUES(?, ?, ?, ?, ?)",
+            (img_hash, query_hash, int(is_match), _pack_explanation(explanation), int(time.time())),
+        )
+        if self._known_queries is not None:
+            self._known_queries.add(query_hash)
     
     def save(self):
-        """Persist cache to disk"""
-        self._save_cache()
+        """Commit any open transaction (writes commit as they are made, so normally a no-op)"""
+        if self._conn.in_transaction:
+            self._conn.execute("COMMIT")
+    
+    def compact(self):
+        """Commit, then fold the write-ahead log back into the database file"""
+        self.save()
+        self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
     
     def get_stats(self) -> Dict:
         """Get cache performance statistics"""
@@ -128,7 +425,7 @@ class ImageAnalysisCache:
         hit_rate = (self.stats["hits"] / total * 100) if total > 0 else 0
         
         return {
-            "total_cached_entries": len(self.cache),
+            "total_cached_entries": self._count_entries(),
             "cache_hits": self.stats["hits"],
             "cache_misses": self.stats["misses"],
             "hit_rate": f"{hit_rate:.1f}%",
@@ -137,11 +434,11 @@ class ImageAnalysisCache:
     
     def _get_cache_file_size(self) -> str:
         """Get human-readable cache file size"""
-        if not self.cache_file.exists():
+        files = [self.cache_file, self.cache_file.with_name(self.cache_file.name + "-wal")]
+        size_bytes = sum(f.stat().st_size for f in files if f.exists())
+        if not size_bytes:
             return "0 KB"
         
-        size_bytes = self.cache_file.stat().st_size
-        
         if size_bytes < 1024:
             return f"{size_bytes} B"
         elif size_bytes < 1024 * 1024:
@@ -154,51 +451,52 @@ class ImageAnalysisCache:
         Remove cache entries older than specified days.
         Useful for preventing cache from growing too large.
         """
-        from datetime import timedelta
-        
-        cutoff_date = datetime.now() - timedelta(days=days)
-        initial_count = len(self.cache)
+        cutoff = int(time.time()) - days * 86400
         
-        # Filter out old entries
-        self.cache = {
-            key: value for key, value in self.cache.items()
-            if datetime.fromisoformat(value["timestamp"]) > cutoff_date
-        }
-        
-        removed_count = initial_count - len(self.cache)
-        self._save_cache()
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            removed_count = self._conn.execute("DELETE FROM entries WHERE ts <= ?", (cutoff,)).rowcount
+            # Entries still awaiting re-keying age out like any other; forget the keys of removed ones
+            self._conn.execute(
+                "DELETE FROM legacy_keys WHERE NOT EXISTS (SELECT 1 FROM entries e"
+                " WHERE e.img_hash = legacy_keys.img_hash AND e.query_hash = legacy_keys.query_hash)"
+            )
+            if self._conn.execute("SELECT 1 FROM legacy_keys LIMIT 1").fetchone() is None:
+                self._set_meta("legacy_hash_algorithm", None)
+                self._legacy_algorithm = None
+        self._known_queries = None
         
         return removed_count
     
     def clear_by_query(self, expanded_query: str):
         """Remove all cache entries for a specific query"""
         query_hash = self._get_query_hash(expanded_query)
-        initial_count = len(self.cache)
-        
-        self.cache = {
-            key: value for key, value in self.cache.items()
-            if not key.endswith(f":{query_hash}")
-        }
-        
-        removed_count = initial_count - len(self.cache)
-        self._save_cache()
-        
+        removed_count = self._conn.execute("DELETE FROM entries WHERE query_hash = ?", (query_hash,)).rowcount
+        if self._known_queries is not None:
+            self._known_queries.discard(query_hash)
         return removed_count
     
     def clear_all(self):
         """Clear entire cache"""
-        count = len(self.cache)
-        self.cache = {}
-        self._save_cache()
+        with self._conn:
+            self._conn.execute("BEGIN IMMEDIATE")
+            count = self._conn.execute("DELETE FROM entries").rowcount
+            self._conn.execute("DELETE FROM legacy_keys")
+            self._set_meta("legacy_hash_algorithm", None)
+        self._legacy_algorithm = None
+        self._known_queries = set()
         return count
     
     def get_queries_analyzed(self) -> List[str]:
-        """Get list of unique queries that have been cached"""
-        query_hashes = set()
-        for key in self.cache.keys():
-            _, query_hash = key.split(":", 1)
-            query_hashes.add(query_hash)
-        return list(query_hashes)
+        """
+        Get list of unique queries that have been cached.
+        The table is scanned once; later calls reuse the set kept current by
+        this instance's writes (entries added by other processes sharing the
+        database afterwards aren't seen).
+        """
+        if self._known_queries is None:
+            self._known_queries = {row[0] for row in self._conn.execute("SELECT DISTINCT query_hash FROM entries")}
+        return [self._hex(query_hash) for query_hash in self._known_queries]
 
 
 # -------------------------
@@ -224,6 +522,10 @@ if __name__ == "__main__":
             count = cache.clear_all()
             print(f"✅ Cleared {count} cache entries")
         
+        elif command == "dump":
+            # Human-readable copy of the cache (the file itself is compact)
+            print(json.dumps(cache.snapshot(), indent=2))
+        
         elif command == "clean":
             days = int(sys.argv[2]) if len(sys.argv) > 2 else 30
             count = cache.clear_old_entries(days)
@@ -231,7 +533,7 @@ if __name__ == "__main__":
         
         else:
             print(f"Unknown command: {command}")
-            print("Available commands: stats, clear, clean [days]")
+            print("Available commands: stats, clear, clean [days], dump")
     
     else:
         stats = cache.get_stats()
@@ -241,4 +543,5 @@ if __name__ == "__main__":
         print("\nUsage:")
         print("  python image_cache.py stats      - Show cache statistics")
         print("  python image_cache.py clear      - Clear all cache")
-        print("  python image_cache.py clean 30   - Remove entries older than 30 days")
\ No newline at end of file
+        print("  python image_cache.py clean 30   - Remove entries older than 30 days")
+        print("  python image_cache.py dump       - Pretty-print all cache entries")
\ No newline at end of file
@@ -0,0 +1,115 @@
+"""
+local_filter.py
+
+Fast local pre-filter for image search using CLIP.
+Scores every image against the search text on this machine so that only
+plausible matches are sent to Gemini for the (slow, billed) verification.
+
+Requirements:
+    pip install sentence-transformers
+"""
+
+import os
+import pickle
+from functools import lru_cache
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import torch
+from PIL import Image
+from sentence_transformers import SentenceTransformer, util
+
+MODEL_NAME = "clip-ViT-B-32"
+BATCH_SIZE = 32
+PREVIEW_SIDE = 448  # Images are shrunk to this before encoding (CLIP uses 224px)
+EMBEDDING_CACHE_FILE = Path(__file__).parent / "clip_embedding_cache.pkl"
+IO_BUFFER_SIZE = 1 << 20  # The pickle is read and written through 1 MB buffers
+
+
+@lru_cache(maxsize=1)
+def load_model() -> SentenceTransformer:
+    """Load the CLIP model once per process"""
+    return SentenceTransformer(MODEL_NAME)
+
+
+def _load_embedding_cache() -> dict:
+    """Load cached image embeddings, keyed by "path:mtime_ns" """
+    if EMBEDDING_CACHE_FILE.exists():
+        try:
+            with open(EMBEDDING_CACHE_FILE, 'rb', buffering=IO_BUFFER_SIZE) as f:
+                return pickle.load(f)
+        except Exception as e:
+            print(f"Warning: Failed to load CLIP embedding cache: {e}")
+    return {}
+
+
+def _save_embedding_cache(cache: dict):
+    """Write via a temp file so an interrupted save can't corrupt the cache"""
+    tmp_file = EMBEDDING_CACHE_FILE.with_suffix(".tmp")
+    try:
+        with open(tmp_file, 'wb', buffering=IO_BUFFER_SIZE) as f:
+            # Protocol 5 writes numpy embeddings as raw contiguous buffers
+            pickle.dump(cache, f, protocol=5)
+        os.replace(tmp_file, EMBEDDING_CACHE_FILE)
+    except Exception as e:
+        print(f"Warning: Failed to save CLIP embedding cache: {e}")
+
+
+def _load_preview(image_path) -> Image.Image:
+    """Open an image at reduced size; full resolution is wasted on CLIP"""
+    with Image.open(image_path) as img:
+        img.draft("RGB", (PREVIEW_SIDE, PREVIEW_SIDE))
+        img_rgb = img.convert("RGB")
+    img_rgb.thumbnail((PREVIEW_SIDE, PREVIEW_SIDE))
+    return img_rgb
+
+
+def encode_images(image_paths: List[Path]) -> dict:
+    """
+    Return {index: normalized CLIP embedding} for the given images; images
+    that can't be opened are left out. Embeddings are cached on disk per
+    (path, mtime), so re-searching a folder only encodes new or changed files.
+    """
+    model = load_model()
+    cache = _load_embedding_cache()
+    keys = [f"{p}:{os.stat(p).st_mtime_ns}" for p in image_paths]
+
+    missing = [i for i, key in enumerate(keys) if key not in cache]
+    for start in range(0, len(missing), BATCH_SIZE):
+        batch, images = [], []
+        for i in missing[start:start + BATCH_SIZE]:
+            try:
+                images.append(_load_preview(image_paths[i]))
+                batch.append(i)
+            except Exception as e:
+                print(f"Skipping {image_paths[i]} in CLIP pre-filter: {e}")
+        if not images:
+            continue
+        embeddings = model.encode(images, batch_size=BATCH_SIZE, convert_to_numpy=True,
+                                  normalize_embeddings=True)
+        for i, embedding in zip(batch, embeddings):
+            cache[keys[i]] = embedding
+    if missing:
+        _save_embedding_cache(cache)
+
+    return {i: cache[key] for i, key in enumerate(keys) if key in cache}
+
+
+def score_images(image_paths: List[Path], query: str) -> List[float]:
+    """
+    Cosine similarity between each image and the query text.
+    Images CLIP couldn't read score 1.0 so they are never filtered out.
+    """
+    embeddings = encode_images(image_paths)
+    scores = [1.0] * len(image_paths)
+    if not embeddings:
+        return scores
+
+    indices = list(embeddings)
+    image_embs = torch.from_numpy(np.stack([embeddings[i] for i in indices]))
+    query_emb = load_model().encode(query, convert_to_tensor=True, normalize_embeddings=True)
+    similarities = util.cos_sim(query_emb.cpu(), image_embs)[0].tolist()
+    for i, similarity in zip(indices, similarities):
+        scores[i] = similarity
+    return scores
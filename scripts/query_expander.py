@@ -6,26 +6,48 @@ Uses Gemini API to generate comprehensive image search criteria.
 """
 
 import json
+import itertools
 import random
+import sqlite3
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
 from google import genai
+from google.genai import types
 
 MODEL_NAME = "gemini-2.0-flash-exp"
+LEGACY_CACHE_FILE = "query_cache.json"  # Pre-SQLite cache, migrated on first use
+MEMORY_CACHE_SIZE = 1024  # Expansions kept in-process in front of the SQLite cache
+EXPANSION_CONFIG = types.GenerateContentConfig(
+    max_output_tokens=200,  # Expansions are 2-4 sentences
+    temperature=0.2,
+)
+
+_cache_lock = threading.Lock()
+_key_lock = threading.Lock()
+_key_cycle = None  # Round-robin iterator over creds.json keys, built on first use
+_memory_cache = OrderedDict()  # (cache_file, query_key) -> expansion, in LRU order
 
 def load_api_key():
-    """Load a random API key from creds.json"""
-    creds_file = Path(__file__).parent / "creds.json"
-    if not creds_file.exists():
-        raise FileNotFoundError("creds.json not found in script directory.")
-    
-    with open(creds_file, 'r') as f:
-        creds = json.load(f)
-    
-    api_keys = creds.get("api_keys", [])
-    if not api_keys:
-        raise ValueError("No API keys found in creds.json")
-    
-    return random.choice(api_keys)
+    """Return the next API key from creds.json, rotating round-robin across calls"""
+    global _key_cycle
+    with _key_lock:
+        if _key_cycle is None:
+            creds_file = Path(__file__).parent / "creds.json"
+            if not creds_file.exists():
+                raise FileNotFoundError("creds.json not found in script directory.")
+            
+            with open(creds_file, 'r') as f:
+                creds = json.load(f)
+            
+            api_keys = creds.get("api_keys", [])
+            if not api_keys:
+                raise ValueError("No API keys found in creds.json")
+            
+            # Random starting order, then even spread so no key takes a burst alone
+            _key_cycle = itertools.cycle(random.sample(api_keys, len(api_keys)))
+        return next(_key_cycle)
 
 
 EXPANSION_PROMPT = """You are an expert at creating detailed image search descriptions. 
@@ -69,6 +91,16 @@ Now expand this user query:
 User: "{query}"
 Expanded:"""
 
+# Literal pieces around each "{query}" placeholder, so building a prompt is a
+# plain join instead of re-parsing the template with str.format on every call
+_PROMPT_PARTS = EXPANSION_PROMPT.split("{query}")
+
+
+@lru_cache(maxsize=8)
+def _client_for(api_key: str) -> genai.Client:
+    """One client per API key, reused so repeat expansions skip client/TLS setup"""
+    return genai.Client(api_key=api_key)
+
 
 def expand_query(user_query: str, api_key: str = None) -> str:
     """
@@ -84,14 +116,15 @@ def expand_query(user_query: str, api_key: str = None) -> str:
     if not api_key:
         api_key = load_api_key()
     
-    client = genai.Client(api_key=api_key)
+    client = _client_for(api_key)
     
-    prompt = EXPANSION_PROMPT.format(query=user_query)
+    prompt = user_query.join(_PROMPT_PARTS)
     
     try:
         response = client.models.generate_content(
             model=MODEL_NAME,
-            contents=[prompt]
+            contents=[prompt],
+            config=EXPANSION_CONFIG
         )
         
         expanded = response.text.strip()
@@ -108,45 +141,73 @@ def expand_query(user_query: str, api_key: str = None) -> str:
         return user_query
 
 
-def expand_query_with_cache(user_query: str, api_key: str = None, cache_file: str = "query_cache.json") -> str:
+@lru_cache(maxsize=None)
+def _get_cache_db(cache_path: Path) -> sqlite3.Connection:
+    """
+    Open (once per process) the SQLite expansion cache, creating it if needed
+    and importing entries from the legacy JSON cache on first use.
+    """
+    conn = sqlite3.connect(cache_path, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE IF NOT EXISTS cache(k TEXT PRIMARY KEY, v TEXT)")
+
+    legacy_path = cache_path.parent / LEGACY_CACHE_FILE
+    is_empty = conn.execute("SELECT 1 FROM cache LIMIT 1").fetchone() is None
+    if is_empty and legacy_path.exists():
+        try:
+            with open(legacy_path, 'r') as f:
+                legacy = json.load(f)
+            conn.executemany("INSERT OR REPLACE INTO cache(k, v) VALUES(?, ?)", legacy.items())
+        except Exception as e:
+            print(f"Failed to migrate {LEGACY_CACHE_FILE}: {e}")
+
+    return conn
+
+
+def expand_query_with_cache(user_query: str, api_key: str = None, cache_file: str = "query_cache.db") -> str:
     """
     Expand query with caching to avoid repeated API calls for same queries.
     
     Args:
         user_query: Short phrase from user
         api_key: Optional API key
-        cache_file: Path to cache file
+        cache_file: Path to SQLite cache file
     
     Returns:
         Expanded description (from cache or fresh API call)
     """
-    cache_path = Path(__file__).parent / cache_file
-    
-    # Load cache
-    cache = {}
-    if cache_path.exists():
-        try:
-            with open(cache_path, 'r') as f:
-                cache = json.load(f)
-        except:
-            cache = {}
-    
-    # Check cache
     query_key = user_query.lower().strip()
-    if query_key in cache:
-        print(f"Using cached expansion for: '{user_query}'")
-        return cache[query_key]
+    memory_key = (cache_file, query_key)
     
-    # Expand and cache
-    expanded = expand_query(user_query, api_key)
-    cache[query_key] = expanded
+    # Check in-process cache first (survives Streamlit reruns, no disk access)
+    with _cache_lock:
+        if memory_key in _memory_cache:
+            _memory_cache.move_to_end(memory_key)
+            return _memory_cache[memory_key]
     
-    # Save cache
-    try:
-        with open(cache_path, 'w') as f:
-            json.dump(cache, f, indent=2)
-    except Exception as e:
-        print(f"Failed to save cache: {e}")
+    conn = _get_cache_db(Path(__file__).parent / cache_file)
+    
+    # Check disk cache
+    with _cache_lock:
+        row = conn.execute("SELECT v FROM cache WHERE k = ?", (query_key,)).fetchone()
+    if row:
+        print(f"Using cached expansion for: '{user_query}'")
+        expanded = row[0]
+    else:
+        # Expand and cache
+        expanded = expand_query(user_query, api_key)
+        
+        # Save cache (single-row upsert, no full rewrite)
+        try:
+            with _cache_lock:
+                conn.execute("INSERT OR REPLACE INTO cache(k, v) VALUES(?, ?)", (query_key, expanded))
+        except Exception as e:
+            print(f"Failed to save cache: {e}")
+    
+    with _cache_lock:
+        _memory_cache[memory_key] = expanded
+        if len(_memory_cache) > MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
     
     return expanded
 
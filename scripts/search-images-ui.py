@@ -1,8 +1,15 @@
 import os
+import time
 import shutil
 import random
 import json
-import time
+import hashlib
+import importlib.util
+from collections import defaultdict
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from io import BytesIO
 from pathlib import Path
 from datetime import datetime
 import streamlit as st
@@ -10,15 +17,30 @@ from PIL import Image
 from google import genai
 from google.genai import types
 
-# Import the query expander
+# Import the query expander and analysis cache
 from scripts.query_expander import expand_query_with_cache
+from scripts.image_cache import ImageAnalysisCache
 
 # -------------------------
 # CONFIG  /Users/jay/Desktop/miss-you-india /Users/jay/Downloads/fall-2025
 # -------------------------
 MODEL_NAME = "gemini-2.0-flash-exp"
 MAX_RETRIES_PER_KEY = 2  # Retries before switching API key
-ROTATION_INTERVAL = 10  # Rotate key every N images as preventive measure
+RATE_LIMIT_COOLDOWN = 60  # Seconds a rate-limited key is skipped by the rotation
+RATE_LIMIT_ATTEMPTS = 3  # Tries per batch on rate limits (even with a single key, after its cooldown)
+MAX_CONCURRENCY = 16  # Default number of in-flight Gemini requests
+BATCH_SIZE = 4  # Default number of images sent per Gemini request
+MAX_IMAGE_SIDE = 1024  # Long edge (px) of images sent to Gemini
+JPEG_QUALITY = 85  # Quality of the JPEG re-encode sent to Gemini
+PASSTHROUGH_EXTS = {'.jpg', '.jpeg', '.png', '.webp'}  # Formats Gemini accepts as-is
+PASSTHROUGH_MAX_BYTES = 4_000_000  # Larger files are downscaled instead
+THUMBNAIL_SIDE = 256  # Long edge (px) of result grid thumbnails
+SAVE_WORKERS = 8  # Threads used to copy selected images to the output folder
+PREFILTER_THRESHOLD = 0.22  # Default CLIP cosine similarity below which an image is skipped
+
+# Optional: local CLIP pre-filter (needs sentence-transformers). Only checked
+# here; torch and the model are imported when the pre-filter is actually used
+CLIP_AVAILABLE = importlib.util.find_spec("sentence_transformers") is not None
 
 # Optional: HEIC support 
 try: 
@@ -96,8 +118,8 @@ class APIKeyManager:
     def __init__(self):
         self.creds_file = Path(__file__).parent / "creds.json"
         self.all_keys = []
-        self.current_key_index = 0
-        self.used_keys = set()
+        self.current_key_index = -1
+        self.cooldown_until = {}  # key -> time.monotonic() when it may be used again
         self.load_keys()
     
     def load_keys(self):
@@ -115,24 +137,42 @@ class APIKeyManager:
         except Exception as e:
             raise Exception(f"Error reading creds.json: {e}")
     
-    def get_random_key(self):
-        """Get a random API key that hasn't been used recently"""
-        if len(self.used_keys) >= len(self.all_keys):
-            # All keys have been used, reset
-            self.used_keys.clear()
-        
-        available_keys = [k for k in self.all_keys if k not in self.used_keys]
-        if not available_keys:
-            available_keys = self.all_keys
-        
-        key = random.choice(available_keys)
-        self.used_keys.add(key)
-        return key
+    def get_key(self):
+        """
+        Get the next API key in round-robin order, skipping keys that are
+        cooling off after a rate limit. Spreading requests evenly keeps each
+        key under its per-minute quota during parallel bursts.
+        """
+        key = self._next_ready_key()
+        if key is not None:
+            return key
+        # Every key is cooling off; use the one that recovers first
+        return min(self.all_keys, key=lambda k: self.cooldown_until.get(k, 0))
+    
+    async def wait_for_key(self):
+        """
+        Like get_key, but if every key is cooling off, sleep until the first
+        one recovers instead of handing out a key that will be rejected again.
+        """
+        while True:
+            key = self._next_ready_key()
+            if key is not None:
+                return key
+            await asyncio.sleep(max(0, min(self.cooldown_until.values()) - time.monotonic()))
     
-    def get_next_key(self):
-        """Get next API key in rotation"""
-        self.current_key_index = (self.current_key_index + 1) % len(self.all_keys)
-        return self.all_keys[self.current_key_index]
+    def _next_ready_key(self):
+        """Next key in round-robin order that isn't cooling off, or None"""
+        now = time.monotonic()
+        for _ in range(len(self.all_keys)):
+            self.current_key_index = (self.current_key_index + 1) % len(self.all_keys)
+            key = self.all_keys[self.current_key_index]
+            if self.cooldown_until.get(key, 0) <= now:
+                return key
+        return None
+    
+    def mark_rate_limited(self, key):
+        """Take a key out of the rotation for RATE_LIMIT_COOLDOWN seconds"""
+        self.cooldown_until[key] = time.monotonic() + RATE_LIMIT_COOLDOWN
     
     def get_key_count(self):
         """Return total number of available keys"""
@@ -141,16 +181,29 @@ class APIKeyManager:
 # -------------------------
 # HELPER FUNCTIONS
 # -------------------------
+MIME_TYPES = {
+    '.jpg':'image/jpeg', '.jpeg':'image/jpeg', '.png':'image/png', 
+    '.webp':'image/webp', '.gif':'image/gif', '.bmp':'image/bmp', 
+    '.heic':'image/heic'
+}
+IMAGE_EXTS = frozenset(MIME_TYPES)
+
 def get_mime_type(image_path):
-    ext = Path(image_path).suffix.lower()
-    return {
-        '.jpg':'image/jpeg', '.jpeg':'image/jpeg', '.png':'image/png', 
-        '.webp':'image/webp', '.gif':'image/gif', '.bmp':'image/bmp', 
-        '.heic':'image/heic'
-    }.get(ext, 'image/jpeg')
+    return MIME_TYPES.get(Path(image_path).suffix.lower(), 'image/jpeg')
 
 def is_image_file(filename):
-    return Path(filename).suffix.lower() in {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp', '.heic'}
+    return os.path.splitext(filename)[1].lower() in IMAGE_EXTS
+
+def list_images(folder):
+    """
+    List image files in a folder. os.scandir reuses the directory entry's
+    cached file type, so there is no stat() call or Path object per entry.
+    """
+    with os.scandir(folder) as entries:
+        return [
+            Path(entry.path) for entry in entries
+            if is_image_file(entry.name) and entry.is_file()
+        ]
 
 def is_rate_limit_error(error_msg):
     """Check if error is due to rate limiting"""
@@ -165,38 +218,64 @@ def is_rate_limit_error(error_msg):
     error_str = str(error_msg).lower()
     return any(indicator in error_str for indicator in rate_limit_indicators)
 
-def analyze_image_with_retry(image_path, api_key_manager, expanded_query, status_placeholder=None):
+def cheap_fingerprint(image_path):
     """
-    Analyze image with automatic API key rotation on rate limit errors.
-    Returns: (is_match, explanation, api_key_used)
+    Fingerprint a file from its size plus its first and last 4 KB.
+    Enough to spot exact duplicates (copies, re-exports) without reading whole files.
+    Unreadable files get a key of their own, so they reach the usual
+    per-image error reporting instead of aborting the search.
     """
-    max_attempts = min(3, api_key_manager.get_key_count())  # Try up to 3 different keys
-    
-    for attempt in range(max_attempts):
-        try:
-            # Get a fresh API key for this attempt
-            if attempt == 0:
-                api_key = api_key_manager.get_random_key()
-            else:
-                api_key = api_key_manager.get_next_key()
-                if status_placeholder:
-                    status_placeholder.warning(f"⚠️ Switching to different API key (attempt {attempt + 1}/{max_attempts})")
-                time.sleep(1)  # Brief pause before retry
-            
-            client = genai.Client(api_key=api_key)
-            
-            # Analyze the image
-            from io import BytesIO
-            with Image.open(image_path) as img:
-                img_rgb = img.convert("RGB")
-                buf = BytesIO()
-                img_rgb.save(buf, format='JPEG')
-                image_bytes = buf.getvalue()
+    try:
+        size = os.path.getsize(image_path)
+        with open(image_path, 'rb') as f:
+            head = f.read(4096)
+            if size > 8192:
+                f.seek(-4096, os.SEEK_END)
+            tail = f.read(4096)
+    except OSError:
+        return f"unreadable:{image_path}"
+    digest = hashlib.blake2b(head + tail, digest_size=8).hexdigest()
+    return f"{size}:{digest}"
 
-            mime_type = get_mime_type(image_path)
-            image_part = types.Part.from_bytes(data=image_bytes, mime_type=mime_type)
+@lru_cache(maxsize=256)
+def encode_image(image_path, mtime):
+    """
+    Downscale to MAX_IMAGE_SIDE and re-encode as JPEG for upload.
+    Gemini gains nothing from full-resolution photos, so this cuts upload size
+    several-fold. Cached per (path, mtime) so re-searches skip decode + resize.
+    """
+    with Image.open(image_path) as img:
+        # JPEG sources decode straight at a reduced scale instead of full size
+        img.draft("RGB", (MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+        img_rgb = img.convert("RGB")
+    img_rgb.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.Resampling.LANCZOS)
+    # getvalue() hands over the buffer without copying when nothing else holds it
+    with BytesIO() as buf:
+        img_rgb.save(buf, format='JPEG', quality=JPEG_QUALITY, optimize=True)
+        return buf.getvalue()
 
-            prompt = f"""Analyze this image carefully and determine if it matches the following description:
+def load_image_bytes(image_path):
+    """
+    Return (bytes, mime_type) to upload for an image.
+    Small JPEG/PNG/WEBP files are sent untouched, skipping a full decode and
+    re-encode; HEIC, GIF/BMP and oversized files go through encode_image.
+    """
+    image_path = Path(image_path)
+    stat = image_path.stat()
+    if image_path.suffix.lower() in PASSTHROUGH_EXTS and stat.st_size < PASSTHROUGH_MAX_BYTES:
+        return image_path.read_bytes(), get_mime_type(image_path)
+    return encode_image(str(image_path), stat.st_mtime), 'image/jpeg'
+
+async def analyze_image(image_path, client, expanded_query):
+    """
+    Run a single Gemini analysis of one image against the expanded query.
+    Returns: (is_match, explanation). API errors are raised to the caller.
+    """
+    # PIL work runs off the event loop so it doesn't stall in-flight requests
+    image_bytes, mime_type = await asyncio.to_thread(load_image_bytes, image_path)
+    image_part = types.Part.from_bytes(data=image_bytes, mime_type=mime_type)
+
+    prompt = f"""Analyze this image carefully and determine if it matches the following description:
 
 "{expanded_query}"
 
@@ -205,31 +284,233 @@ Important instructions:
 - Ignore irrelevant background details
 - Consider all the criteria mentioned in the description
 - Answer ONLY "Yes" or "No", followed by a brief explanation of why it matches or doesn't match"""
+
+    response = await client.aio.models.generate_content(
+        model=MODEL_NAME,
+        contents=[prompt, image_part]
+    )
+    text = response.text.strip()
+    is_match = text.lower().startswith("yes")
+    return is_match, text
+
+def parse_batch_response(text, count):
+    """
+    Parse the JSON array returned for a batched request.
+    Returns a list of (is_match, explanation) in image order; raises ValueError
+    if the reply isn't a well-formed answer for exactly `count` images.
+    """
+    text = text.strip().removeprefix("```json").removeprefix("```").removesuffix("```")
+    try:
+        answers = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Batch reply is not valid JSON: {e}")
+    if not isinstance(answers, list) or not all(isinstance(a, dict) for a in answers):
+        raise ValueError("Batch reply is not a JSON array of objects")
+
+    results = [None] * count
+    for answer in answers:
+        index = answer.get("index")
+        if not isinstance(index, int) or not 0 <= index < count:
+            raise ValueError(f"Batch reply has an invalid index: {index!r}")
+        if results[index] is not None:
+            raise ValueError(f"Batch reply answers image {index} twice")
+        match = answer.get("match")
+        if isinstance(match, str):
+            match = {"yes": True, "true": True, "no": False, "false": False}.get(match.strip().lower())
+        if not isinstance(match, bool):
+            raise ValueError(f"Batch reply has an unrecognised match value: {answer.get('match')!r}")
+        results[index] = (match, f"{'Yes' if match else 'No'}. {answer.get('reason', '')}".strip())
+
+    if None in results:
+        raise ValueError("Batch reply is missing answers for some images")
+    return results
+
+async def analyze_image_batch(image_paths, client, expanded_query):
+    """
+    Analyze several images in one Gemini request so the instructions and
+    expanded query are only sent (and billed) once per batch.
+    Returns: list in the order of image_paths of (is_match, explanation), or
+    the exception for images that couldn't be loaded (they are left out of the request).
+    """
+    loaded = await asyncio.gather(
+        *(asyncio.to_thread(load_image_bytes, p) for p in image_paths), return_exceptions=True
+    )
+    results = list(loaded)
+    readable = [i for i, item in enumerate(loaded) if not isinstance(item, BaseException)]
+    if not readable:
+        return results
+
+    prompt = f"""You will be shown {len(readable)} images, numbered from 0. For each image, determine if it matches the following description:
+
+"{expanded_query}"
+
+Important instructions:
+- Focus on the main subject of each image
+- Ignore irrelevant background details
+- Consider all the criteria mentioned in the description
+- Return ONLY a JSON array with one object per image, in order:
+  [{{"index": 0, "match": "Yes" or "No", "reason": "brief explanation of why it matches or doesn't match"}}, ...]"""
+
+    contents = [prompt]
+    for index, i in enumerate(readable):
+        image_bytes, mime_type = loaded[i]
+        contents.append(f"Image {index}:")
+        contents.append(types.Part.from_bytes(data=image_bytes, mime_type=mime_type))
+
+    response = await client.aio.models.generate_content(model=MODEL_NAME, contents=contents)
+    for i, answer in zip(readable, parse_batch_response(response.text, len(readable))):
+        results[i] = answer
+    return results
+
+async def analyze_batch(image_paths, client, expanded_query):
+    """
+    Analyze a batch of images, falling back to one request per image if the
+    batched reply can't be parsed or the request fails for another reason than
+    a rate limit (e.g. Gemini rejects one of the images), so one bad image
+    doesn't fail the rest.
+    Returns: list of (is_match, explanation), or the exception for images that
+    failed on their own. Rate limit errors are raised to the caller.
+    """
+    if len(image_paths) == 1:
+        return [await analyze_image(image_paths[0], client, expanded_query)]
+    try:
+        return await analyze_image_batch(image_paths, client, expanded_query)
+    except Exception as e:
+        if is_rate_limit_error(str(e)):
+            raise
+    results = await asyncio.gather(
+        *(analyze_image(p, client, expanded_query) for p in image_paths), return_exceptions=True
+    )
+    for result in results:
+        if isinstance(result, BaseException) and is_rate_limit_error(str(result)):
+            raise result
+    return results
+
+async def analyze_manual_key(image_paths, client, expanded_query):
+    """
+    Analyze with a fixed client (manual key override), without rotation.
+    Returns: list of (is_match, explanation, succeeded)
+    """
+    try:
+        results = await analyze_batch(image_paths, client, expanded_query)
+        return [(False, str(r), False) if isinstance(r, BaseException) else (*r, True) for r in results]
+    except Exception as e:
+        return [(False, str(e), False)] * len(image_paths)
+
+async def analyze_image_with_retry(image_paths, api_key_manager, expanded_query, status_placeholder=None):
+    """
+    Analyze a batch of images with automatic API key rotation on rate limit errors.
+    When every key is cooling off, waits for the first one to recover.
+    Returns: list of (is_match, explanation, api_key_used)
+    """
+    max_attempts = RATE_LIMIT_ATTEMPTS
+    
+    for attempt in range(max_attempts):
+        try:
+            # Get a fresh API key for this attempt
+            api_key = await api_key_manager.wait_for_key()
+            if attempt > 0:
+                if status_placeholder:
+                    status_placeholder.warning(f"⚠️ Switching to different API key (attempt {attempt + 1}/{max_attempts})")
+                await asyncio.sleep(1)  # Brief pause before retry
             
-            response = client.models.generate_content(
-                model=MODEL_NAME,
-                contents=[prompt, image_part]
-            )
-            text = response.text.strip()
-            is_match = text.lower().startswith("yes")
+            client = genai.Client(api_key=api_key)
+            results = await analyze_batch(image_paths, client, expanded_query)
             
-            return is_match, text, api_key
+            # Images that failed on their own are reported as errors (and not cached)
+            return [(False, f"Error: {r}", None) if isinstance(r, BaseException) else (*r, api_key)
+                    for r in results]
         
         except Exception as e:
             error_msg = str(e)
             
             if is_rate_limit_error(error_msg):
+                api_key_manager.mark_rate_limited(api_key)
                 if attempt < max_attempts - 1:
                     if status_placeholder:
                         status_placeholder.warning(f"🔄 Rate limit hit, switching API key...")
                     continue
                 else:
-                    return False, f"Rate limit error after trying {max_attempts} keys: {error_msg}", None
+                    return [(False, f"Rate limit error after {max_attempts} attempts: {error_msg}", None)] * len(image_paths)
             else:
                 # Non-rate-limit error, return immediately
-                return False, f"Error: {error_msg}", None
+                return [(False, f"Error: {error_msg}", None)] * len(image_paths)
     
-    return False, "Failed after all retry attempts", None
+    return [(False, "Failed after all retry attempts", None)] * len(image_paths)
+
+async def analyze_all(batches, analyze, concurrency, on_result):
+    """
+    Run analyze(batch) for every batch of images with at most `concurrency`
+    requests in flight, calling on_result(batch, results) as each finishes.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(batch):
+        async with semaphore:
+            return batch, await analyze(batch)
+
+    for next_done in asyncio.as_completed([run_one(b) for b in batches]):
+        batch, batch_results = await next_done
+        on_result(batch, batch_results)
+
+def save_image(img_path, save_path, use_hardlink=False):
+    """
+    Copy one image into save_path. copyfile skips metadata and lets Python use
+    the OS fast path (sendfile / CopyFileEx); hardlinks avoid copying entirely.
+    """
+    dst = save_path / Path(img_path).name
+    if use_hardlink:
+        try:
+            os.link(img_path, dst)
+            return
+        except OSError:
+            pass  # Different filesystem or unsupported, fall back to a copy
+    shutil.copyfile(img_path, dst)
+
+@st.cache_resource
+def get_expansion_executor():
+    """Small pool shared across reruns for expanding queries ahead of time."""
+    return ThreadPoolExecutor(max_workers=2)
+
+def prewarm_expansion(manual_key):
+    """
+    on_change callback for the query box: start expanding the query in the
+    background so the result is usually ready by the time Run is clicked.
+    """
+    query = st.session_state.get("search_query_input", "")
+    if not query.strip():
+        return
+    api_key = manual_key or st.session_state.api_key_manager.get_key()
+    future = get_expansion_executor().submit(expand_query_with_cache, query, api_key)
+    st.session_state.expansion_future = (query, future)
+
+@st.cache_data(show_spinner=False, max_entries=1000)
+def load_thumbnail(image_path, mtime):
+    """
+    Small JPEG preview for the results grid, so reruns don't reload originals.
+    mtime is only part of the cache key: replacing a file invalidates its thumbnail.
+    """
+    with Image.open(image_path) as img:
+        img.draft("RGB", (THUMBNAIL_SIDE, THUMBNAIL_SIDE))
+        img_rgb = img.convert("RGB")
+    img_rgb.thumbnail((THUMBNAIL_SIDE, THUMBNAIL_SIDE), Image.Resampling.LANCZOS)
+    with BytesIO() as buf:
+        img_rgb.save(buf, format='JPEG', quality=80)
+        return buf.getvalue()
+
+def update_selection():
+    """Form submit callback: read every checkbox once and store the selection."""
+    st.session_state.selected_images = [
+        img_path for i, (img_path, _) in enumerate(st.session_state.detected_images)
+        if st.session_state.get(f"sel_{i}")
+    ]
+
+def get_expansion(query, api_key):
+    """Use the pre-warmed expansion for this exact query if there is one."""
+    prewarmed = st.session_state.get("expansion_future")
+    if prewarmed and prewarmed[0] == query:
+        return prewarmed[1].result()
+    return expand_query_with_cache(query, api_key)
 
 # -------------------------
 # STREAMLIT UI
@@ -249,6 +530,11 @@ except Exception as e:
     st.error(f"Failed to initialize API keys: {e}")
     st.stop()
 
+# Persistent cache of (image content, expanded query) -> analysis result
+if 'analysis_cache' not in st.session_state:
+    st.session_state.analysis_cache = ImageAnalysisCache()
+analysis_cache = st.session_state.analysis_cache
+
 # Sidebar: input/output folders
 input_folder = st.sidebar.text_input("Input Folder Path", value="./images")
 output_base = st.sidebar.text_input("Output Base Folder", value="./selected_images")
@@ -257,6 +543,34 @@ st.sidebar.markdown("### API Key Info")
 st.sidebar.info(f"🔑 {api_key_manager.get_key_count()} API keys loaded from creds.json")
 st.sidebar.caption("Keys will automatically rotate to avoid rate limits")
 
+max_concurrency = st.sidebar.slider(
+    "Parallel requests", min_value=1, max_value=64, value=MAX_CONCURRENCY,
+    help="Number of requests sent at the same time. Lower this if you hit API quota limits."
+)
+batch_size = st.sidebar.slider(
+    "Images per request", min_value=1, max_value=8, value=BATCH_SIZE,
+    help="Images are sent to Gemini in batches so the prompt is only billed once per batch."
+)
+
+st.sidebar.markdown("### Local Pre-filter")
+if CLIP_AVAILABLE:
+    use_prefilter = st.sidebar.checkbox(
+        "Pre-filter with local CLIP model",
+        help="Scores images locally and only sends likely matches to Gemini. Much cheaper on large folders."
+    )
+    prefilter_threshold = st.sidebar.slider(
+        "CLIP similarity threshold", min_value=0.10, max_value=0.40,
+        value=PREFILTER_THRESHOLD, step=0.01, disabled=not use_prefilter
+    )
+else:
+    use_prefilter = False
+    st.sidebar.caption("Install sentence-transformers to enable the local CLIP pre-filter")
+
+save_via_hardlink = st.sidebar.checkbox(
+    "Save via hardlink (same disk only)",
+    help="Saves instantly without copying data. Falls back to a normal copy across disks."
+)
+
 # Manual API key override (optional)
 manual_key = st.sidebar.text_input("Override with manual API key (optional)", type="password")
 if manual_key:
@@ -278,7 +592,10 @@ if "expanded_query" not in st.session_state:
 st.markdown("### 🔍 Enter Your Search Query")
 search_query = st.text_input(
     "Short phrase (e.g., 'rolled sleeves', 'white tshirt', 'ocean with boat'):",
-    placeholder="Type your search query here..."
+    placeholder="Type your search query here...",
+    key="search_query_input",
+    on_change=prewarm_expansion,
+    args=(manual_key,)
 )
 
 col1, col2 = st.columns([3, 1])
@@ -290,8 +607,8 @@ with col2:
 # Preview expansion without running search
 if preview_expansion and search_query:
     with st.spinner("Expanding your query..."):
-        preview_key = manual_key if manual_key else api_key_manager.get_random_key()
-        expanded = expand_query_with_cache(search_query, preview_key)
+        preview_key = manual_key if manual_key else api_key_manager.get_key()
+        expanded = get_expansion(search_query, preview_key)
         st.markdown("#### 📝 Expanded Query:")
         st.markdown(f'<div class="expanded-query">{expanded}</div>', unsafe_allow_html=True)
 
@@ -301,15 +618,15 @@ if run_search and search_query:
         st.error(f"Input folder '{input_folder}' not found")
         st.stop()
     
-    all_images = [f for f in Path(input_folder).iterdir() if f.is_file() and is_image_file(f.name)]
+    all_images = list_images(input_folder)
     if not all_images:
         st.warning("No images found in folder.")
         st.stop()
     
     # Expand the query first
     with st.spinner("🔄 Expanding your query for better search accuracy..."):
-        expand_key = manual_key if manual_key else api_key_manager.get_random_key()
-        expanded_query = expand_query_with_cache(search_query, expand_key)
+        expand_key = manual_key if manual_key else api_key_manager.get_key()
+        expanded_query = get_expansion(search_query, expand_key)
         st.session_state.expanded_query = expanded_query
     
     # Show the expanded query
@@ -321,66 +638,101 @@ if run_search and search_query:
     detected_images = []
     progress_bar = st.progress(0)
     status_text = st.empty()
-    key_rotation_info = st.empty()
 
-    images_processed_with_current_key = 0
-    
-    for i, img_path in enumerate(all_images):
-        # Rotate key preventively every N images
-        if not manual_key and images_processed_with_current_key >= ROTATION_INTERVAL:
-            key_rotation_info.markdown(
-                f'<div class="api-key-info">🔄 Preventively rotating API key after {ROTATION_INTERVAL} images</div>', 
-                unsafe_allow_html=True
-            )
-            images_processed_with_current_key = 0
-            time.sleep(0.5)
-            key_rotation_info.empty()
-        
-        status_text.text(f"Analyzing: {img_path.name} ({i+1}/{len(all_images)})")
-        
-        if manual_key:
-            # Use manual key without rotation
-            client = genai.Client(api_key=manual_key)
-            from io import BytesIO
-            with Image.open(img_path) as img:
-                img_rgb = img.convert("RGB")
-                buf = BytesIO()
-                img_rgb.save(buf, format='JPEG')
-                image_bytes = buf.getvalue()
-            mime_type = get_mime_type(img_path)
-            image_part = types.Part.from_bytes(data=image_bytes, mime_type=mime_type)
-            prompt = f"""Analyze this image carefully and determine if it matches the following description:
-"{expanded_query}"
-Important instructions:
-- Focus on the main subject of the image
-- Ignore irrelevant background details
-- Consider all the criteria mentioned in the description
-- Answer ONLY "Yes" or "No", followed by a brief explanation of why it matches or doesn't match"""
-            try:
-                response = client.models.generate_content(model=MODEL_NAME, contents=[prompt, image_part])
-                text = response.text.strip()
-                is_match = text.lower().startswith("yes")
-            except Exception as e:
-                is_match, text = False, str(e)
+    # Serve repeat (image, query) pairs from the on-disk cache; only misses hit the API
+    analysis_cache.bulk_prime(all_images)
+    results = {}
+    to_analyze = []
+    for img_path in all_images:
+        cached = analysis_cache.get(img_path, expanded_query)
+        if cached is not None:
+            results[img_path] = cached
         else:
-            # Use automatic key rotation
-            is_match, text, key_used = analyze_image_with_retry(
-                img_path, api_key_manager, expanded_query, status_text
-            )
-            images_processed_with_current_key += 1
-        
+            to_analyze.append(img_path)
+    cache_hits = len(results)
+    progress_bar.progress(cache_hits / len(all_images))
+
+    # Cheap local CLIP pass: only plausible matches go on to Gemini. Uses the
+    # short query, since CLIP handles the expansion's exclusion clauses poorly
+    prefiltered = 0
+    if use_prefilter and to_analyze:
+        with st.spinner("🧠 Scoring images locally with CLIP..."):
+            from scripts import local_filter
+            scores = local_filter.score_images(to_analyze, search_query)
+        kept = []
+        for img_path, score in zip(to_analyze, scores):
+            if score >= prefilter_threshold:
+                kept.append(img_path)
+            else:
+                results[img_path] = (False, f"No. Skipped by local CLIP pre-filter (similarity {score:.2f})")
+        prefiltered = len(to_analyze) - len(kept)
+        to_analyze = kept
+        progress_bar.progress(len(results) / len(all_images))
+
+    # Duplicate files only need one API call; the answer is shared by the group
+    duplicates = defaultdict(list)
+    for img_path in to_analyze:
+        duplicates[cheap_fingerprint(img_path)].append(img_path)
+    to_analyze = [group[0] for group in duplicates.values()]
+    copies_of = {group[0]: group for group in duplicates.values()}
+
+    failed = []  # Images whose analysis errored (reported, not shown as matches)
+
+    def record_results(batch, batch_results):
+        for img_path, (is_match, text, succeeded) in zip(batch, batch_results):
+            for copy_path in copies_of[img_path]:
+                results[copy_path] = (is_match, text)
+
+            # Only cache real answers, never errors
+            if succeeded:
+                analysis_cache.set(img_path, expanded_query, is_match, text)
+            else:
+                failed.extend(copies_of[img_path])
+
+        done_count = len(results)
+        status_text.text(f"Analyzed: {batch[-1].name} ({done_count}/{len(all_images)})")
+        progress_bar.progress(done_count / len(all_images))
+
+    # Analyses are network-bound, so overlap them on one event loop; results
+    # are reported from this thread, which keeps Streamlit widgets happy
+    if manual_key:
+        # Use manual key without rotation
+        client = genai.Client(api_key=manual_key)
+        analyze = partial(analyze_manual_key, client=client, expanded_query=expanded_query)
+    else:
+        # Use automatic key rotation
+        analyze = partial(analyze_image_with_retry, api_key_manager=api_key_manager, expanded_query=expanded_query)
+    batches = [to_analyze[i:i + batch_size] for i in range(0, len(to_analyze), batch_size)]
+    asyncio.run(analyze_all(batches, analyze, max_concurrency, record_results))
+
+    analysis_cache.save()
+
+    # Keep results in folder order regardless of completion order
+    for img_path in all_images:
+        is_match, text = results[img_path]
         if is_match:
             detected_images.append((img_path, text))
-        
-        progress_bar.progress((i + 1) / len(all_images))
 
     status_text.empty()
-    key_rotation_info.empty()
     st.success(f"✅ Analysis complete! {len(detected_images)} images matched your query.")
+    if failed:
+        st.warning(f"⚠️ {len(failed)} image(s) couldn't be analyzed (e.g. rate limits or unreadable files) "
+                   f"and are not included; run the search again to retry them.")
+        with st.expander("Show errors"):
+            for img_path in failed:
+                st.text(f"{img_path.name}: {results[img_path][1]}")
+    if cache_hits:
+        st.caption(f"⚡ {cache_hits} of {len(all_images)} results served from the analysis cache")
+    if prefiltered:
+        st.caption(f"🧠 {prefiltered} image(s) ruled out locally by CLIP without an API call")
+    if len(copies_of) < len(all_images) - cache_hits - prefiltered:
+        st.caption(f"🧬 {len(all_images) - cache_hits - prefiltered - len(copies_of)} duplicate image(s) reused another file's result")
     
     # Store results in session state
     st.session_state.detected_images = detected_images
     st.session_state.selected_images = []  # Reset selection
+    for key in [k for k in st.session_state if str(k).startswith("sel_")]:
+        del st.session_state[key]
     st.session_state.search_query = search_query
 
 # -------------------------
@@ -404,8 +756,11 @@ if st.session_state.detected_images:
                 save_path = Path(output_base) / folder_name
                 os.makedirs(save_path, exist_ok=True)
                 
-                for img_path in st.session_state.selected_images:
-                    shutil.copy(img_path, save_path)
+                with ThreadPoolExecutor(max_workers=SAVE_WORKERS) as executor:
+                    list(executor.map(
+                        partial(save_image, save_path=save_path, use_hardlink=save_via_hardlink),
+                        st.session_state.selected_images
+                    ))
                 
                 st.success(f"✅ Successfully saved {len(st.session_state.selected_images)} image(s) to: {save_path}")
                 st.balloons()
@@ -413,36 +768,30 @@ if st.session_state.detected_images:
             st.button(f"💾 Save Selected Images", disabled=True, use_container_width=True)
             st.caption("Select at least one image to enable save")
     
-    st.markdown("### 🖼️ Click on images to select/deselect")
+    st.markdown("### 🖼️ Tick images to select, then update the selection")
     st.caption(f"Selected: {len(st.session_state.selected_images)} / {len(st.session_state.detected_images)}")
     
-    # Display images in grid
-    cols = st.columns(5)
-    for i, (img_path, explanation) in enumerate(st.session_state.detected_images):
-        with cols[i % 5]:
-            is_selected = img_path in st.session_state.selected_images
-            
-            # Create clickable image with selection state
-            if st.button(
-                f"{'✅ ' if is_selected else '⬜ '}{Path(img_path).name}",
-                key=f"imgbtn_{i}",
-                use_container_width=True
-            ):
+    # Checkboxes inside a form batch up clicks; the page only reruns on submit
+    with st.form("selection"):
+        # Display images in grid
+        cols = st.columns(5)
+        for i, (img_path, explanation) in enumerate(st.session_state.detected_images):
+            with cols[i % 5]:
+                is_selected = img_path in st.session_state.selected_images
+                
+                st.checkbox(Path(img_path).name, key=f"sel_{i}", value=is_selected)
+                
+                # Display image with border based on selection
                 if is_selected:
-                    st.session_state.selected_images.remove(img_path)
+                    st.markdown('<div class="image-container image-selected">', unsafe_allow_html=True)
                 else:
-                    st.session_state.selected_images.append(img_path)
-                st.rerun()
-            
-            # Display image with border based on selection
-            if is_selected:
-                st.markdown('<div class="image-container image-selected">', unsafe_allow_html=True)
-            else:
-                st.markdown('<div class="image-container image-unselected">', unsafe_allow_html=True)
-            
-            st.image(str(img_path), use_container_width=True)
-            st.markdown('</div>', unsafe_allow_html=True)
-            
-            # Show explanation in expander
-            with st.expander("🤖 AI Analysis"):
-                st.caption(explanation)
\ No newline at end of file
+                    st.markdown('<div class="image-container image-unselected">', unsafe_allow_html=True)
+                
+                st.image(load_thumbnail(str(img_path), os.path.getmtime(img_path)), use_container_width=True)
+                st.markdown('</div>', unsafe_allow_html=True)
+                
+                # Show explanation in expander
+                with st.expander("🤖 AI Analysis"):
+                    st.caption(explanation)
+        
+        st.form_submit_button("✅ Update selection", type="primary", on_click=update_selection)